@@ -0,0 +1,70 @@
+"""Fire concurrent bookings at one villa and check that no two accepted stays overlap.
+
+Every request books a random short stay inside a small date window, so most of
+them collide. The run reports accepted/conflicting counts, bookings/sec, and
+fails if the accepted stays overlap:
+
+    python benchmarks/bench_booking_contention.py --token <jwt> --villa-id 1 --bookings 500
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date, timedelta
+import httpx
+
+
+async def book(client, url, villa_id, start, window_days, outcomes):
+    offset = random.randrange(window_days)
+    nights = random.randint(1, 4)
+    check_in = start + timedelta(days=offset)
+    response = await client.post(url, json={
+        "villa_id": villa_id,
+        "check_in_date": check_in.isoformat(),
+        "check_out_date": (check_in + timedelta(days=nights)).isoformat(),
+        "people_count": 1,
+    })
+    outcomes.append(response.status_code)
+
+
+def find_overlaps(stays):
+    stays = sorted((date.fromisoformat(s["check_in_date"]), date.fromisoformat(s["check_out_date"])) for s in stays)
+    return [(a, b) for a, b in zip(stays, stays[1:]) if b[0] < a[1]]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8003")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--villa-id", type=int, default=1)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--window-days", type=int, default=60)
+    parser.add_argument("--start", default=(date.today() + timedelta(days=365)).isoformat())
+    args = parser.parse_args()
+
+    start = date.fromisoformat(args.start)
+    outcomes = []
+    limits = httpx.Limits(max_connections=args.bookings)
+    async with httpx.AsyncClient(headers={"Authorization": f"Bearer {args.token}"}, limits=limits, timeout=60) as client:
+        began = time.perf_counter()
+        await asyncio.gather(*(
+            book(client, f"{args.base_url}/reservations/", args.villa_id, start, args.window_days, outcomes)
+            for _ in range(args.bookings)
+        ))
+        elapsed = time.perf_counter() - began
+        stays = (await client.get(f"{args.base_url}/reservations/villa/{args.villa_id}/dates")).json()
+
+    accepted = outcomes.count(200)
+    conflicts = outcomes.count(409)
+    print(f"bookings={len(outcomes)} accepted={accepted} conflicts={conflicts} other={len(outcomes) - accepted - conflicts}")
+    print(f"elapsed={elapsed:.2f}s bookings/sec={len(outcomes) / elapsed:.1f}")
+    overlaps = find_overlaps(stays)
+    if overlaps:
+        print(f"FAIL: {len(overlaps)} overlapping stays, e.g. {overlaps[0]}")
+        sys.exit(1)
+    print("OK: no overlapping stays")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
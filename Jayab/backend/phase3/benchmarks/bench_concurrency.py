@@ -0,0 +1,52 @@
+"""Fire a burst of concurrent requests at one endpoint and report tail latency.
+
+Run once against a build with the synchronous session layer and once against the
+async one to compare p99 under load:
+
+    python benchmarks/bench_concurrency.py --url http://localhost:8002/villas/ --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+
+def percentile(latencies, pct):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+
+async def timed_get(client, url, latencies, errors):
+    start = time.perf_counter()
+    try:
+        response = await client.get(url)
+        if response.status_code >= 500:
+            errors.append(response.status_code)
+    except httpx.HTTPError as e:
+        errors.append(type(e).__name__)
+    latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8002/villas/")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--token", help="Bearer token for authenticated endpoints")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    latencies, errors = [], []
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            await asyncio.gather(*(timed_get(client, args.url, latencies, errors) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"requests={len(latencies)} errors={len(errors)} rps={len(latencies) / elapsed:.1f}")
+    print(f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms p99={percentile(latencies, 99):.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
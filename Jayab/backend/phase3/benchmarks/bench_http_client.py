@@ -0,0 +1,53 @@
+"""Compare per-request latency of a fresh httpx client against a shared pooled one.
+
+Run against a running stack, e.g. the booking path lookup that reservation-service
+makes on every booking:
+
+    python benchmarks/bench_http_client.py --url http://localhost:8002/villas/1 --requests 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<14} mean={statistics.mean(latencies):7.2f}ms p50={p50:7.2f}ms p99={p99:7.2f}ms")
+
+
+async def fresh_client(url, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            await client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def pooled_client(url, count):
+    latencies = []
+    async with httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=20)) as client:
+        for _ in range(count):
+            start = time.perf_counter()
+            await client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8002/villas/1")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    summarize("fresh client", await fresh_client(args.url, args.requests))
+    summarize("pooled client", await pooled_client(args.url, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""Upload many large images concurrently and watch the receiving process's memory.
+
+Posts ``--uploads`` random images of ``--size-mb`` each, either straight to
+media-service or through villa-service's create endpoint. Pass ``--pid`` of a
+local uvicorn process to sample its peak RSS during the run:
+
+    python benchmarks/bench_image_upload.py --target media --uploads 50 --size-mb 20
+    python benchmarks/bench_image_upload.py --target villa --token <admin jwt> --pid 12345
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import httpx
+
+VILLA = {
+    "title": "Benchmark Villa", "city": "Bench", "address": "Nowhere", "base_capacity": 2,
+    "maximum_capacity": 4, "area": 100, "bed_count": 2, "has_pool": False, "has_cooling_system": False,
+    "base_price_per_night": 100, "extra_person_price": 10, "rating": 0,
+}
+
+
+def read_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], read_rss_mb(pid))
+        await asyncio.sleep(0.05)
+
+
+async def upload(client, args, payload):
+    files = {"file" if args.target == "media" else "image": ("bench.jpg", payload, "image/jpeg")}
+    if args.target == "media":
+        response = await client.post(f"{args.media_url}/media/upload", files=files)
+    else:
+        response = await client.post(f"{args.villa_url}/villas/", files=files, data={"villa": json.dumps(VILLA)})
+    return response.status_code
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=["media", "villa"], default="media")
+    parser.add_argument("--media-url", default="http://localhost:8004")
+    parser.add_argument("--villa-url", default="http://localhost:8002")
+    parser.add_argument("--token", help="Admin bearer token, required for --target villa")
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--pid", type=int, help="Local process to sample peak RSS from")
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    peak, stop = [0.0], asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(args.pid, peak, stop)) if args.pid else None
+
+    async with httpx.AsyncClient(headers=headers, timeout=300, limits=httpx.Limits(max_connections=args.uploads)) as client:
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(upload(client, args, payload) for _ in range(args.uploads)))
+        elapsed = time.perf_counter() - start
+
+    stop.set()
+    if sampler:
+        await sampler
+    total_mb = args.uploads * args.size_mb
+    print(f"uploads={len(statuses)} ok={statuses.count(200)} elapsed={elapsed:.2f}s throughput={total_mb / elapsed:.1f}MB/s")
+    if args.pid:
+        print(f"peak RSS of pid {args.pid}: {peak[0]:.1f}MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
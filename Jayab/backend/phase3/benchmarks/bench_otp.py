@@ -0,0 +1,46 @@
+"""Measure OTP validations per second against a single otp-service worker.
+
+Generates an OTP for each of ``--phones`` numbers, then validates them all
+concurrently (one correct submission each) and reports throughput:
+
+    python benchmarks/bench_otp.py --url http://localhost:8005 --phones 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8005")
+    parser.add_argument("--phones", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    phones = [f"0990{i:07d}" for i in range(args.phones)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        async def generate(phone):
+            async with semaphore:
+                response = await client.post("/otp/generate", json={"phone_number": phone})
+                return phone, response.json()["otp"]
+
+        async def validate(phone, otp):
+            async with semaphore:
+                response = await client.post("/otp/validate", json={"phone_number": phone, "otp": otp})
+                return response.status_code
+
+        otps = await asyncio.gather(*(generate(phone) for phone in phones))
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(validate(phone, otp) for phone, otp in otps))
+        elapsed = time.perf_counter() - start
+
+    print(f"validations={len(statuses)} ok={statuses.count(200)} elapsed={elapsed:.2f}s")
+    print(f"validations/sec={len(statuses) / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
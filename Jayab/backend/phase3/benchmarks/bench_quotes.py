@@ -0,0 +1,60 @@
+"""Measure batch price-quote latency against reservation-service.
+
+Sends ``--requests`` quote requests of ``--quotes`` (villa, dates, people) tuples
+each, spread over the first ``--villas`` villas that villa-service returns, and
+reports per-request latency and quotes per second:
+
+    python benchmarks/bench_quotes.py --villa-url http://localhost:8002 --url http://localhost:8003 --quotes 10000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import date, timedelta
+import httpx
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8003")
+    parser.add_argument("--villa-url", default="http://localhost:8002")
+    parser.add_argument("--villas", type=int, default=100)
+    parser.add_argument("--quotes", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.get(f"{args.villa_url}/villas/", params={"limit": args.villas})
+        response.raise_for_status()
+        villa_ids = [villa["id"] for villa in response.json()]
+        if not villa_ids:
+            raise SystemExit("villa-service returned no villas to quote")
+
+        rng = random.Random(0)
+        today = date.today()
+        items = []
+        for _ in range(args.quotes):
+            check_in = today + timedelta(days=rng.randint(0, 365))
+            items.append({
+                "villa_id": rng.choice(villa_ids),
+                "check_in_date": check_in.isoformat(),
+                "check_out_date": (check_in + timedelta(days=rng.randint(1, 14))).isoformat(),
+                "people_count": rng.randint(1, 6),
+            })
+
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = await client.post(f"{args.url}/reservations/quotes/", json={"items": items})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    quoted = sum(1 for result in response.json() if result["total_price"] is not None)
+    print(f"quotes/request={len(items)} priced={quoted} villas={len(villa_ids)}")
+    print(f"p50={statistics.median(latencies) * 1000:.1f}ms max={max(latencies) * 1000:.1f}ms")
+    print(f"quotes/sec={len(items) * len(latencies) / sum(latencies):.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
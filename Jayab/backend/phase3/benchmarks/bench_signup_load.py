@@ -0,0 +1,78 @@
+"""Measure /users/profile latency while a burst of signups is hashing passwords.
+
+Needs a valid token for the profile probe. Raise RATE_LIMIT_SIGNUP on
+user-service first so the per-IP signup window does not throttle the burst:
+
+    python benchmarks/bench_signup_load.py --token <jwt> --signups 100
+"""
+import argparse
+import asyncio
+import random
+import time
+import httpx
+
+
+async def signup(client, index):
+    suffix = f"{random.randrange(10**7):07d}"
+    data = {
+        "first_name": "Bench", "last_name": f"User{index}",
+        "national_code": f"9{suffix}{index % 100:02d}", "phone_number": f"0991{suffix}", "password": "bench-password",
+    }
+    response = await client.post("/auth/signup", json=data)
+    if response.status_code != 200:
+        return response.status_code
+    otp = response.json()["otp_response"]["otp"]
+    response = await client.post("/auth/signup/verify", json={
+        "request": {"phone_number": data["phone_number"], "otp": otp},
+        "signup_data": data,
+    })
+    return response.status_code
+
+
+async def probe_profile(client, token, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/users/profile", headers={"Authorization": f"Bearer {token}"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<16} samples={len(latencies)} p50={p50:.1f}ms p99={p99:.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--signups", type=int, default=100)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        idle, loaded = [], []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_profile(client, args.token, stop, idle))
+        await asyncio.sleep(2)
+        stop.set()
+        await probe
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_profile(client, args.token, stop, loaded))
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(signup(client, i) for i in range(args.signups)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    print(f"signups={len(statuses)} ok={statuses.count(200)} elapsed={elapsed:.2f}s")
+    report("profile idle", idle)
+    report("profile loaded", loaded)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
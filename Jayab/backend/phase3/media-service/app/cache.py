@@ -0,0 +1,211 @@
+from collections import OrderedDict, namedtuple
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+load_dotenv()
+MEDIA_MEMORY_CACHE_BYTES = int(os.getenv("MEDIA_MEMORY_CACHE_BYTES", str(64 * 1024 * 1024)))
+MEDIA_MEMORY_CACHE_MAX_OBJECT = int(os.getenv("MEDIA_MEMORY_CACHE_MAX_OBJECT", str(1024 * 1024)))
+MEDIA_DISK_CACHE_DIR = os.getenv("MEDIA_DISK_CACHE_DIR", "/tmp/media-cache")
+MEDIA_DISK_CACHE_BYTES = int(os.getenv("MEDIA_DISK_CACHE_BYTES", str(1024 * 1024 * 1024)))
+MEDIA_CACHE_MAX_OBJECT = int(os.getenv("MEDIA_CACHE_MAX_OBJECT", str(16 * 1024 * 1024)))
+# How long a cached entry is trusted before its ETag is checked against MinIO again
+MEDIA_CACHE_REVALIDATE = float(os.getenv("MEDIA_CACHE_REVALIDATE", "60"))
+
+ObjectInfo = namedtuple("ObjectInfo", ["etag", "size", "content_type", "last_modified"])
+
+class CacheEntry:
+    def __init__(self, info: ObjectInfo, data: bytes = None, path: str = None):
+        self.info = info
+        self.data = data
+        self.path = path
+        self.validated_at = time.monotonic()
+
+class ByteBudgetLRU:
+    """LRU of CacheEntry objects bounded by the total size of what they hold."""
+
+    def __init__(self, budget: int, on_evict=None):
+        self.budget = budget
+        self.used = 0
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry):
+        self.pop(key)
+        self._entries[key] = entry
+        self.used += entry.info.size
+        while self.used > self.budget and self._entries:
+            self.pop(next(iter(self._entries)))
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.used -= entry.info.size
+            if self.on_evict:
+                self.on_evict(entry)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+def remove_path(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def remove_file(entry: CacheEntry):
+    remove_path(entry.path)
+
+def write_file(directory: str, download, keep_bytes: bool):
+    """Download into a new uniquely named file and return its path, plus its bytes if asked.
+
+    The file only becomes visible once the index points at it, so a partial download is
+    never served and concurrent fills can never share or truncate one another's file.
+    """
+    fd, path = tempfile.mkstemp(dir=directory, prefix="fill-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            download(f)
+        if not keep_bytes:
+            return path, None
+        with open(path, "rb") as f:
+            return path, f.read()
+    except BaseException:
+        os.unlink(path)
+        raise
+
+def link_file(entry: CacheEntry):
+    """Hard-link a cached file under a per-request name and return that path.
+
+    The link keeps the inode reachable by path even if eviction unlinks the entry's own
+    name mid-send; the caller removes it once the response is done. Returns None if the
+    entry was evicted before it could be linked.
+    """
+    path = os.path.join(os.path.dirname(entry.path), f"serve-{uuid.uuid4().hex}")
+    try:
+        os.link(entry.path, path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def pid_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MediaCache:
+    """Two-tier hot-object cache: small objects in memory, everything cacheable on local disk.
+
+    Each worker process keeps its files in its own subdirectory of MEDIA_DISK_CACHE_DIR,
+    since the index that knows about them lives in that process's memory.
+    """
+
+    def __init__(self):
+        self.memory = ByteBudgetLRU(MEDIA_MEMORY_CACHE_BYTES)
+        self.disk = ByteBudgetLRU(MEDIA_DISK_CACHE_BYTES, on_evict=remove_file)
+        self.directory = os.path.join(MEDIA_DISK_CACHE_DIR, str(os.getpid()))
+        self._fills = {}  # key -> task downloading it, so concurrent misses fetch it once
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fill_errors = 0
+
+    def prepare_disk(self):
+        # Clear this process's directory and those of workers that have exited; live
+        # siblings sharing MEDIA_DISK_CACHE_DIR keep their files
+        os.makedirs(MEDIA_DISK_CACHE_DIR, exist_ok=True)
+        for name in os.listdir(MEDIA_DISK_CACHE_DIR):
+            path = os.path.join(MEDIA_DISK_CACHE_DIR, name)
+            if name == str(os.getpid()) or not name.isdigit() or not pid_alive(int(name)):
+                shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def lookup(self, key: str, etag: str = None):
+        """Return a usable entry for ``key``.
+
+        Without ``etag`` only entries validated within MEDIA_CACHE_REVALIDATE are returned.
+        With ``etag`` (fresh from a stat) an entry is returned and re-validated only if it matches.
+        """
+        entry = self.memory.get(key) or self.disk.get(key)
+        if entry is None:
+            return None
+        if etag is None:
+            return entry if time.monotonic() - entry.validated_at < MEDIA_CACHE_REVALIDATE else None
+        if entry.info.etag != etag:
+            self.memory.pop(key)
+            self.disk.pop(key)
+            return None
+        entry.validated_at = time.monotonic()
+        return entry
+
+    def forget(self, key: str):
+        self.memory.pop(key)
+        self.disk.pop(key)
+
+    def record(self, entry: CacheEntry):
+        if entry is None:
+            self.misses += 1
+        elif entry.data is not None:
+            self.memory_hits += 1
+        else:
+            self.disk_hits += 1
+
+    async def fill(self, key: str, info: ObjectInfo, download):
+        """Cache ``key`` by calling ``download(file)`` on the threadpool and return the new entry.
+
+        Returns None if the object could not be written, in which case the caller streams
+        it from MinIO instead.
+        """
+        if info.size > MEDIA_CACHE_MAX_OBJECT:
+            return None
+        task = self._fills.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, info, download))
+            self._fills[key] = task
+            task.add_done_callback(lambda _: self._fills.pop(key, None))
+        await asyncio.shield(task)
+        return self.lookup(key, etag=info.etag)
+
+    async def _fill(self, key: str, info: ObjectInfo, download):
+        keep_bytes = info.size <= MEDIA_MEMORY_CACHE_MAX_OBJECT
+        try:
+            path, data = await run_in_threadpool(write_file, self.directory, download, keep_bytes)
+        except Exception:
+            # A full disk or a failed read only costs the cache, never the request
+            self.fill_errors += 1
+            return
+        self.disk.put(key, CacheEntry(info, path=path))
+        if data is not None:
+            self.memory.put(key, CacheEntry(info, data=data))
+
+    def stats(self):
+        requests = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / requests if requests else 0.0,
+            "memory_bytes": self.memory.used,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk.used,
+            "disk_entries": len(self.disk),
+            "fill_errors": self.fill_errors,
+        }
+
+media_cache = MediaCache()
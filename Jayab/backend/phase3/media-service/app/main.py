@@ -1,12 +1,31 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response, BackgroundTasks
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from .minio_client import minio_client
+from .variants import variant_object_name, generate_variants, ensure_variant, download_object, remove_image
+from .cache import media_cache, link_file, remove_path, ObjectInfo
+from .presign import get_presigned_url, MEDIA_PRESIGN_MARGIN
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from .metrics import MetricsMiddleware, monitor_event_loop_lag, metrics_response
+from typing import Literal, Optional
 from dotenv import load_dotenv
+from functools import partial
+import asyncio
+import multiprocessing
+from email.utils import format_datetime, parsedate_to_datetime
 import os
 import uuid
 
 load_dotenv()
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(256 * 1024)))
+# "proxy" streams bytes through this service; "redirect" sends clients to a presigned MinIO URL
+MEDIA_SERVING_MODE = os.getenv("MEDIA_SERVING_MODE", "proxy")
+MEDIA_VARIANT_WORKERS = int(os.getenv("MEDIA_VARIANT_WORKERS", "2"))
+# MinIO buffers one part per upload in memory; 5 MB is the smallest part S3 accepts
+MEDIA_UPLOAD_PART_SIZE = int(os.getenv("MEDIA_UPLOAD_PART_SIZE", str(5 * 1024 * 1024)))
 
 # Supported image formats and their extensions
 IMAGE_FORMATS = {
@@ -16,6 +35,18 @@ IMAGE_FORMATS = {
     "image/webp": ".webp"
 }
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    # Resizing is CPU-bound, so it runs in worker processes rather than on the event loop.
+    # Workers are spawned, not forked: a fork would inherit the MinIO client's open sockets
+    # and whatever locks the threadpool held, so each worker builds its own client on import.
+    app.state.variant_pool = ProcessPoolExecutor(max_workers=MEDIA_VARIANT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    media_cache.prepare_disk()
+    yield
+    lag_monitor.cancel()
+    app.state.variant_pool.shutdown()
+
 app = FastAPI(
     title="Media Service",
     description="Handles image uploads and retrieval for villas",
@@ -25,9 +56,12 @@ app = FastAPI(
             "name": "media",
             "description": "Endpoints for uploading and retrieving images"
         }
-    ]
+    ],
+    lifespan=lifespan
 )
 
+# Added first so CORS stays outermost
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
@@ -37,7 +71,7 @@ app.add_middleware(
 )
 
 @app.post("/media/upload", tags=["media"])
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     try:
         # Validate content type
         if file.content_type not in IMAGE_FORMATS:
@@ -49,15 +83,19 @@ async def upload_image(file: UploadFile = File(...)):
         object_name = f"{file_id}{file_extension}"
 
         # Upload to MinIO
-        minio_client.put_object(
+        await run_in_threadpool(
+            minio_client.put_object,
             bucket_name="villa-images",
             object_name=object_name,
             data=file.file,
             length=-1,
             content_type=file.content_type,
-            part_size=10*1024*1024
+            part_size=MEDIA_UPLOAD_PART_SIZE
         )
 
+        # Render thumb/medium/large WebP variants once the response is out
+        background_tasks.add_task(generate_variants, request.app.state.variant_pool, object_name)
+
         # Generate media-service URL
         media_service_host = os.getenv("MEDIA_SERVICE_HOST", "localhost:8004")
         url = f"http://{media_service_host}/media/{object_name}"
@@ -65,43 +103,160 @@ async def upload_image(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def stream_minio_object(bucket_name: str, object_name: str):
-    response = None
+def parse_range(range_header: str, size: int):
+    """Parse a single ``bytes=start-end`` range into an inclusive (start, end) pair."""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError
+    return start, end
+
+def is_not_modified(request: Request, etag: str, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def stream_minio_object(response):
+    # MinIO reads block, so each chunk is read on the threadpool
     try:
-        response = minio_client.get_object(bucket_name, object_name)
         while True:
-            chunk = response.read(8192)  # Read in 8KB chunks
+            chunk = await run_in_threadpool(response.read, MEDIA_CHUNK_SIZE)
             if not chunk:
                 break
             yield chunk
-    except Exception as e:
-        raise HTTPException(status_code=404, detail="Image not found")
     finally:
-        if response:
-            response.close()
-            response.release_conn()
+        response.close()
+        response.release_conn()
+
+class LinkedFileResponse(FileResponse):
+    """FileResponse over a per-request hard link, removed by its background task.
+
+    Starlette skips the background task when the client disconnects mid-send, so the
+    link is also removed on that path rather than lingering until the next restart.
+    """
+
+    chunk_size = MEDIA_CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException:
+            remove_path(self.path)
+            raise
+
+@app.delete("/media/{image_id}", tags=["media"])
+async def delete_image(image_id: str):
+    # Lets callers roll back uploads whose surrounding request failed; variants go with the original
+    try:
+        await run_in_threadpool(remove_image, image_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    media_cache.forget(image_id)
+    return {"message": "Image deleted"}
+
+@app.get("/media/cache/stats", tags=["media"])
+async def get_cache_stats():
+    return media_cache.stats()
 
 @app.get("/media/{image_id}", tags=["media"])
-async def get_image(image_id: str):
+async def get_image(image_id: str, request: Request, variant: Optional[Literal["thumb", "medium", "large"]] = None):
+    if MEDIA_SERVING_MODE == "redirect":
+        presigned = await get_presigned_url(request.app.state.variant_pool, image_id, variant)
+        if presigned is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        url, valid_for = presigned
+        return RedirectResponse(url, status_code=307, headers={
+            "Cache-Control": f"private, max-age={max(0, valid_for - MEDIA_PRESIGN_MARGIN)}"
+        })
+
+    object_name = variant_object_name(image_id, variant) if variant else image_id
+    # A recently validated cache entry answers without touching MinIO at all
+    cached = media_cache.lookup(object_name)
+    if cached:
+        info = cached.info
+    else:
+        try:
+            obj_info = await run_in_threadpool(minio_client.stat_object, "villa-images", object_name)
+        except Exception as e:
+            if not variant:
+                raise HTTPException(status_code=404, detail="Image not found")
+            # Variant not rendered yet (older upload or failed background job): build it now
+            try:
+                await ensure_variant(request.app.state.variant_pool, image_id, variant)
+                obj_info = await run_in_threadpool(minio_client.stat_object, "villa-images", object_name)
+            except Exception as e:
+                raise HTTPException(status_code=404, detail="Image not found")
+        info = ObjectInfo(f'"{obj_info.etag}"', obj_info.size, obj_info.content_type or "image/png", obj_info.last_modified)
+        cached = media_cache.lookup(object_name, etag=info.etag)
+
+    etag = info.etag
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"inline; filename=\"{image_id}\"",
+        "Cache-Control": "public, max-age=3600"  # Allow caching for 1 hour
+    }
+    if info.last_modified:
+        headers["Last-Modified"] = format_datetime(info.last_modified, usegmt=True)
+    if is_not_modified(request, etag, info.last_modified):
+        return Response(status_code=304, headers=headers)
+
+    size = info.size
+    status_code = 200
+    offset, length = 0, size
+    range_header = request.headers.get("range")
+    # A stale If-Range validator means the client gets the whole object instead
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            start, end = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        status_code = 206
+        offset, length = start, end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    # Whole-object reads go through the hot-object cache; ranges stream straight from MinIO
+    if status_code == 200:
+        media_cache.record(cached)
+        if cached is None:
+            cached = await media_cache.fill(object_name, info, partial(download_object, object_name))
+        if cached and cached.data is not None:
+            return Response(content=cached.data, media_type=info.content_type, headers=headers)
+        # The file is linked before responding; if it was evicted first, fall back to MinIO
+        path = await run_in_threadpool(link_file, cached) if cached else None
+        if path:
+            return LinkedFileResponse(path, media_type=info.content_type, headers=headers, background=BackgroundTask(remove_path, path))
+
     try:
-        # Check if object exists
-        minio_client.stat_object("villa-images", image_id)
+        response = await run_in_threadpool(minio_client.get_object, "villa-images", object_name, offset=offset, length=length)
     except Exception as e:
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    content_type = "image/png"  # Default
-    try:
-        # Get object metadata to determine Content-Type
-        obj_info = minio_client.stat_object("villa-images", image_id)
-        content_type = obj_info.content_type or "image/png"
-    except Exception:
-        print(f"Could not get metadata for {image_id}, using default Content-Type")
-    
+
     return StreamingResponse(
-        content=stream_minio_object("villa-images", image_id),
-        media_type=content_type,
-        headers={
-            "Content-Disposition": f"inline; filename=\"{image_id}\"",
-            "Cache-Control": "public, max-age=3600"  # Allow caching for 1 hour
-        }
+        content=stream_minio_object(response),
+        status_code=status_code,
+        media_type=info.content_type,
+        headers=headers
     )
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
+import urllib3
+
+load_dotenv()
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route and status", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being handled")
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+MINIO_LATENCY = Histogram("minio_request_duration_seconds", "MinIO request latency to first byte", ["method", "status"])
+
+class MetricsMiddleware:
+    """Time every request, labelled by route template rather than raw path to bound cardinality."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # FastAPI records the matched route in the scope during routing
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+
+async def monitor_event_loop_lag():
+    # A blocked loop shows up as a sleep that overshoots its interval
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(time.perf_counter() - start - EVENT_LOOP_LAG_INTERVAL, 0))
+
+def metrics_response():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+class InstrumentedPoolManager(urllib3.PoolManager):
+    """urllib3 pool for the MinIO client that times each request, retries included."""
+
+    def urlopen(self, method, url, redirect=True, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = super().urlopen(method, url, redirect=redirect, **kwargs)
+            status = str(response.status)
+            return response
+        finally:
+            MINIO_LATENCY.labels(method, status).observe(time.perf_counter() - start)
@@ -1,15 +1,35 @@
 from minio import Minio
+from .metrics import InstrumentedPoolManager
 from dotenv import load_dotenv
 import os
+import urllib3
 
 load_dotenv()
+# Same settings as the MinIO client's default pool, with request timing added
 minio_client = Minio(
     os.getenv("MINIO_HOST"),
     access_key=os.getenv("MINIO_ROOT_USER"),
     secret_key=os.getenv("MINIO_ROOT_PASSWORD"),
-    secure=False
+    secure=False,
+    # With a region set the client skips the bucket-location lookup before its first request
+    region=os.getenv("MINIO_REGION"),
+    http_client=InstrumentedPoolManager(
+        timeout=urllib3.Timeout(connect=300, read=300),
+        maxsize=10,
+        retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+    )
 )
 
 # Create bucket if it doesn't exist
 if not minio_client.bucket_exists("villa-images"):
-    minio_client.make_bucket("villa-images")
\ No newline at end of file
+    minio_client.make_bucket("villa-images")
+
+# Presigned URLs are signed for the host clients use, which differs from the in-cluster one.
+# A fixed region keeps presigning offline instead of asking that host for the bucket location.
+presign_client = Minio(
+    os.getenv("EXTERNAL_MINIO_HOST") or os.getenv("MINIO_HOST"),
+    access_key=os.getenv("MINIO_ROOT_USER"),
+    secret_key=os.getenv("MINIO_ROOT_PASSWORD"),
+    secure=False,
+    region=os.getenv("MINIO_REGION", "us-east-1")
+)
\ No newline at end of file
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from concurrent.futures import Executor
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
+from .minio_client import minio_client, presign_client
+from .variants import BUCKET, variant_object_name, ensure_variant
+from dotenv import load_dotenv
+import os
+import time
+
+load_dotenv()
+MEDIA_PRESIGN_TTL = int(os.getenv("MEDIA_PRESIGN_TTL", "600"))
+# Stop handing out a cached URL this long before it expires so clients still have time to use it
+MEDIA_PRESIGN_MARGIN = int(os.getenv("MEDIA_PRESIGN_MARGIN", "60"))
+MEDIA_PRESIGN_CACHE_SIZE = int(os.getenv("MEDIA_PRESIGN_CACHE_SIZE", "10000"))
+
+_cache = OrderedDict()  # object name -> (expires_at, url)
+
+async def get_presigned_url(pool: Executor, image_id: str, variant: str = None):
+    """Return (url, seconds it stays valid) for an image, or None if it does not exist."""
+    object_name = variant_object_name(image_id, variant) if variant else image_id
+    now = time.time()
+    cached = _cache.get(object_name)
+    if cached and cached[0] - MEDIA_PRESIGN_MARGIN > now:
+        _cache.move_to_end(object_name)
+        return cached[1], int(cached[0] - now)
+
+    # Only cache misses pay for a stat, so a URL is never signed for a missing object
+    try:
+        await run_in_threadpool(minio_client.stat_object, BUCKET, object_name)
+    except Exception:
+        if not variant:
+            return None
+        try:
+            await ensure_variant(pool, image_id, variant)
+        except Exception:
+            return None
+
+    url = presign_client.presigned_get_object(BUCKET, object_name, expires=timedelta(seconds=MEDIA_PRESIGN_TTL))
+    _cache[object_name] = (now + MEDIA_PRESIGN_TTL, url)
+    while len(_cache) > MEDIA_PRESIGN_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return url, MEDIA_PRESIGN_TTL
@@ -0,0 +1,98 @@
+from concurrent.futures import Executor
+from PIL import Image, ImageOps
+from .minio_client import minio_client
+from minio.error import S3Error
+from dotenv import load_dotenv
+import asyncio
+import io
+import os
+
+load_dotenv()
+BUCKET = "villa-images"
+# Longest edge in pixels for each derivative
+VARIANTS = {
+    "thumb": 300,
+    "medium": 800,
+    "large": 1600,
+}
+VARIANT_QUALITY = int(os.getenv("MEDIA_VARIANT_QUALITY", "80"))
+
+# Lazy generations in flight, so concurrent requests for one missing variant render it once
+_inflight = {}
+
+def variant_object_name(image_id: str, variant: str):
+    return f"variants/{variant}/{image_id}.webp"
+
+def render_variant(data: bytes, max_size: int, quality: int):
+    """Resize an encoded image to fit ``max_size`` and re-encode it as WebP.
+
+    Runs in a worker process, so it only takes and returns plain bytes.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=quality, method=4)
+        return output.getvalue()
+
+def read_object(object_name: str):
+    response = minio_client.get_object(BUCKET, object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+def download_object(object_name: str, file, chunk_size: int = 256 * 1024):
+    # Copies chunk by chunk, so the object never has to fit in memory
+    response = minio_client.get_object(BUCKET, object_name)
+    try:
+        for chunk in response.stream(chunk_size):
+            file.write(chunk)
+    finally:
+        response.close()
+        response.release_conn()
+
+def remove_image(image_id: str):
+    # Removing a missing object is not an error, so variants that were never rendered are fine
+    for object_name in (image_id, *(variant_object_name(image_id, variant) for variant in VARIANTS)):
+        minio_client.remove_object(BUCKET, object_name)
+
+def build_variant(image_id: str, variant: str):
+    """Read the original from MinIO, render one variant and store it.
+
+    Runs entirely in a worker process so the original's bytes never sit in the web process.
+    """
+    rendered = render_variant(read_object(image_id), VARIANTS[variant], VARIANT_QUALITY)
+    minio_client.put_object(
+        bucket_name=BUCKET,
+        object_name=variant_object_name(image_id, variant),
+        data=io.BytesIO(rendered),
+        length=len(rendered),
+        content_type="image/webp"
+    )
+    # A delete that lands mid-render finds no variant to remove, so drop it here instead
+    try:
+        minio_client.stat_object(BUCKET, image_id)
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            minio_client.remove_object(BUCKET, variant_object_name(image_id, variant))
+
+async def store_variant(pool: Executor, image_id: str, variant: str):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(pool, build_variant, image_id, variant)
+
+async def generate_variants(pool: Executor, image_id: str):
+    await asyncio.gather(*(store_variant(pool, image_id, variant) for variant in VARIANTS))
+
+async def ensure_variant(pool: Executor, image_id: str, variant: str):
+    """Render a missing variant from the original and store it for later requests."""
+    key = variant_object_name(image_id, variant)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(store_variant(pool, image_id, variant))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    await asyncio.shield(task)
@@ -1,10 +1,30 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request
+from contextlib import asynccontextmanager
+from .metrics import MetricsMiddleware, monitor_event_loop_lag, metrics_response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from .redis_client import redis_client
+from .redis_client import create_redis_client, get_redis, VALIDATE_OTP_SCRIPT
+from .rate_limit import enforce_rate_limit, ConcurrencyLimitMiddleware
+from dotenv import load_dotenv
+import asyncio
+import redis.asyncio as redis
+import os
 import random
 import string
 
+load_dotenv()
+OTP_TTL = int(os.getenv("OTP_TTL", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    app.state.redis = create_redis_client()
+    app.state.validate_otp = app.state.redis.register_script(VALIDATE_OTP_SCRIPT)
+    yield
+    lag_monitor.cancel()
+    await app.state.redis.aclose()
+
 app = FastAPI(
     title="OTP Service",
     description="Handles one-time password (OTP) generation and verification",
@@ -14,15 +34,20 @@ app = FastAPI(
             "name": "otp",
             "description": "Endpoints for generating and verifying OTPs"
         }
-    ]
+    ],
+    lifespan=lifespan
 )
 
+# Added first so CORS stays outermost and shed responses still carry CORS headers
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 class OTPRequest(BaseModel):
@@ -33,19 +58,32 @@ class OTPValidateRequest(BaseModel):
     otp: str
 
 @app.post("/otp/generate", tags=["otp"], summary="Generate OTP for a phone number")
-async def generate_otp(request: OTPRequest):
+async def generate_otp(request: OTPRequest, http_request: Request, redis_client: redis.Redis = Depends(get_redis)):
+    await enforce_rate_limit(redis_client, "otp_generate", http_request, request.phone_number)
     otp = ''.join(random.choices(string.digits, k=6))
-    redis_client.setex(f"otp:{request.phone_number}", 300, otp)  # 5-minute TTL
+    # A new OTP also resets the failed-attempt counter, in one round trip
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.setex(f"otp:{request.phone_number}", OTP_TTL, otp)
+        pipe.delete(f"otp_attempts:{request.phone_number}")
+        await pipe.execute()
     return {"message": "OTP generated", "otp": otp}  # For testing
 
 @app.post("/otp/validate", tags=["otp"], summary="Validate OTP for a phone number")
-async def validate_otp(request: OTPValidateRequest):
-    stored_otp = redis_client.get(f"otp:{request.phone_number}")
-    if not stored_otp or stored_otp != request.otp:
+async def validate_otp(request: OTPValidateRequest, http_request: Request):
+    result = await http_request.app.state.validate_otp(
+        keys=[f"otp:{request.phone_number}", f"otp_attempts:{request.phone_number}"],
+        args=[request.otp, OTP_MAX_ATTEMPTS],
+    )
+    if result == -2:
+        raise HTTPException(status_code=429, detail="Too many invalid attempts, request a new OTP")
+    if result != 1:
         raise HTTPException(status_code=400, detail="Invalid OTP")
-    redis_client.delete(f"otp:{request.phone_number}")
     return {"message": "OTP validated"}
 
 @app.get("/", tags=["root"], summary="Root Endpoint of OTP Service")
 def read_root():
-    return {"message": "OTP Service"}
\ No newline at end of file
+    return {"message": "OTP Service"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
\ No newline at end of file
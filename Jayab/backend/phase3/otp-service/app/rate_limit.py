@@ -0,0 +1,85 @@
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+from dotenv import load_dotenv
+import redis.asyncio as redis
+import math
+import os
+import time
+import uuid
+
+load_dotenv()
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "200"))
+
+# Sliding-window log in a sorted set, checked and updated atomically.
+# KEYS[1] = window key; ARGV = now (ms), window (ms), limit, unique member.
+# Returns 0 when the request is admitted, otherwise milliseconds until a slot frees up.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return math.max(1, tonumber(oldest[2]) + window - now)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return 0
+"""
+
+def parse_limits(spec: str):
+    """Parse "phone:3/60,ip:20/60" into [(scope, limit, window_seconds), ...]."""
+    limits = []
+    for part in spec.split(","):
+        if part.strip():
+            scope, _, rule = part.strip().partition(":")
+            limit, _, window = rule.partition("/")
+            limits.append((scope, int(limit), int(window)))
+    return limits
+
+# OTPs are requested by user-service on the client's behalf, so the caller address here is
+# user-service itself; per-IP limits belong there, where the real client address is visible.
+RATE_LIMITS = {
+    "otp_generate": parse_limits(os.getenv("RATE_LIMIT_OTP_GENERATE", "phone:3/60")),
+}
+
+async def enforce_rate_limit(redis_client: redis.Redis, route: str, request: Request, phone_number: str = None):
+    """Raise 429 with Retry-After if any per-phone or per-IP window for ``route`` is full."""
+    identities = {"phone": phone_number, "ip": request.client.host if request.client else None}
+    script = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+    now_ms = int(time.time() * 1000)
+    for scope, limit, window in RATE_LIMITS[route]:
+        identity = identities.get(scope)
+        if not identity:
+            continue
+        try:
+            wait_ms = await script(keys=[f"ratelimit:{route}:{scope}:{identity}"], args=[now_ms, window * 1000, limit, uuid.uuid4().hex])
+        except redis.RedisError:
+            continue  # Fail open: an unavailable limiter should not take the route down with it
+        if wait_ms:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": str(math.ceil(wait_ms / 1000))},
+            )
+
+class ConcurrencyLimitMiddleware:
+    """Shed requests with 429 once this process already has ``max_concurrent`` in flight."""
+
+    def __init__(self, app, max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_concurrent:
+            response = JSONResponse({"detail": "Server is busy, try again later"}, status_code=429, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -1,6 +1,50 @@
-import redis
+from fastapi import Request
+import redis.asyncio as redis
+from .metrics import observe_redis
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
-redis_client = redis.Redis(host=os.getenv("REDIS_HOST"), port=6379, decode_responses=True)
\ No newline at end of file
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+# Checks an OTP and consumes it in one atomic round trip, counting failed attempts.
+# KEYS[1] = otp key, KEYS[2] = attempts key; ARGV[1] = submitted otp, ARGV[2] = max attempts.
+# Returns 1 valid, 0 wrong, -1 no otp, -2 too many attempts (the otp is then burned).
+VALIDATE_OTP_SCRIPT = """
+local stored = redis.call('GET', KEYS[1])
+if not stored then
+    return -1
+end
+local attempts = redis.call('INCR', KEYS[2])
+if attempts == 1 then
+    redis.call('EXPIRE', KEYS[2], redis.call('TTL', KEYS[1]))
+end
+if attempts > tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return -2
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+return 0
+"""
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that times each command; pipelines run as one unit and are not broken out."""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis(args[0], start)
+
+
+def create_redis_client():
+    return InstrumentedRedis(host=os.getenv("REDIS_HOST"), port=REDIS_PORT, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS)
+
+def get_redis(request: Request) -> redis.Redis:
+    return request.app.state.redis
@@ -1,6 +1,8 @@
 from passlib.context import CryptContext
+import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Use the same work factor as user-service so the bootstrap hash is not weaker or slower than the rest
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12")))
 password = "admin"
 hashed_password = pwd_context.hash(password)
 
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from datetime import date
+from dotenv import load_dotenv
+import base64
+import os
+import time
+
+load_dotenv()
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "30"))
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "5000"))
+
+def occupancy(start: date, days: int, stays):
+    """One byte per day in the window, 1 where a stay covers that night."""
+    nights = bytearray(days)
+    for check_in_date, check_out_date in stays:
+        first = max((check_in_date - start).days, 0)
+        last = min((check_out_date - start).days, days)
+        nights[first:last] = b"\x01" * max(last - first, 0)
+    return bytes(nights)
+
+def encode_bitmap(nights: bytes):
+    # Bit i of the packed bytes is day i, least significant bit first
+    packed = bytearray((len(nights) + 7) // 8)
+    for day, booked in enumerate(nights):
+        if booked:
+            packed[day // 8] |= 1 << (day % 8)
+    return base64.b64encode(bytes(packed)).decode()
+
+def encode_runs(nights: bytes):
+    runs = []
+    for booked in nights:
+        if runs and runs[-1][0] == booked:
+            runs[-1][1] += 1
+        else:
+            runs.append([booked, 1])
+    return runs
+
+class AvailabilityCache:
+    """LRU of per-window occupancy, dropped per villa when its reservations change.
+
+    Invalidation is local to the worker that handled the write; the TTL bounds how
+    stale other workers can be. Bookings stay safe regardless, since the database
+    rejects overlaps.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (villa_id, start, days) -> (expires_at, nights)
+        self._by_villa = {}  # villa_id -> set of keys
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, villa_id: int, start: date, days: int):
+        key = (villa_id, start, days)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, villa_id: int, start: date, days: int, nights: bytes):
+        key = (villa_id, start, days)
+        self._entries[key] = (time.monotonic() + self.ttl, nights)
+        self._entries.move_to_end(key)
+        self._by_villa.setdefault(villa_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._discard(evicted)
+
+    def invalidate(self, villa_id: int):
+        for key in self._by_villa.pop(villa_id, ()):
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _discard(self, key):
+        keys = self._by_villa.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_villa[key[0]]
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_TTL, AVAILABILITY_CACHE_SIZE)
@@ -1,32 +1,81 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from .models import SessionLocal
-import httpx
+from jose import JWTError, jwt
+from .models import SessionLocal, ReadSessionLocal, recent_writes
+from .redis_client import redis_client
 from dotenv import load_dotenv
+import hashlib
 import os
+import redis
+import time
 
 load_dotenv()
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL")
-VILLA_SERVICE_URL = os.getenv("VILLA_SERVICE_URL")
+SECRET_KEY = os.getenv("JWT_SECRET")
+ALGORITHM = "HS256"
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_REVOCATION_CHECK = os.getenv("TOKEN_REVOCATION_CHECK", "true").lower() == "true"
 bearer_scheme = HTTPBearer(scheme_name="BearerAuth", description="Enter the JWT token obtained from /auth/login/verify")
 
-def get_db():
-    db = SessionLocal()
-    try:
+# token -> (cached_until, claims); verified tokens are re-checked against revocations once the entry lapses
+_token_cache = {}
+
+def client_key(request: Request):
+    # The bearer token follows a client across requests; anonymous callers fall back to their address
+    identity = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+async def get_db(request: Request):
+    async with SessionLocal() as db:
+        db.info["client"] = client_key(request)
         yield db
-    finally:
-        db.close()
+
+async def get_read_db(request: Request):
+    # Read-only handlers go to the replica unless this client committed moments ago
+    session_factory = SessionLocal if recent_writes.active(client_key(request)) else ReadSessionLocal
+    async with session_factory() as db:
+        yield db
+
+async def is_token_revoked(payload: dict):
+    # Fails closed: while Redis is unreachable a revoked token cannot be told apart, so
+    # requests are refused with 503 rather than honoured. Unlike the rate limiter, which
+    # only sheds load and fails open, this check is what makes logout stick.
+    if not TOKEN_REVOCATION_CHECK:
+        return False
+    try:
+        revoked_jti, revoked_before = await redis_client.mget(f"revoked:jti:{payload.get('jti')}", f"revoked:user:{payload.get('sub')}")
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token revocation check unavailable, try again later", headers={"Retry-After": "1"})
+    if revoked_jti:
+        return True
+    return revoked_before is not None and payload.get("iat", 0) <= int(revoked_before)
+
+async def verify_token(token: str):
+    now = time.time()
+    cached = _token_cache.get(token)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        claims = {"id": int(payload["sub"]), "role": payload["role"]}
+    except (JWTError, KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if await is_token_revoked(payload):
+        _token_cache.pop(token, None)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+
+    if TOKEN_CACHE_TTL > 0:
+        if len(_token_cache) >= TOKEN_CACHE_SIZE:
+            _token_cache.pop(next(iter(_token_cache)))
+        _token_cache[token] = (min(now + TOKEN_CACHE_TTL, payload["exp"]), claims)
+    return claims
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/users/profile", headers={"Authorization": f"Bearer {credentials.credentials}"})
-        if response.status_code != 200:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return response.json()
+    return await verify_token(credentials.credentials)
 
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/users/profile", headers={"Authorization": f"Bearer {credentials.credentials}"})
-        if response.status_code != 200 or response.json().get("role") != "admin":
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-        return response.json()
\ No newline at end of file
+    user = await verify_token(credentials.credentials)
+    if user["role"] != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
@@ -0,0 +1,46 @@
+from fastapi import Request
+from .metrics import HTTP_CLIENT_EVENT_HOOKS
+import asyncio
+import httpx
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+# Below uvicorn's 5s keep-alive timeout, so a connection the peer is about to close is never reused
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "4"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.1"))
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def create_http_client():
+    # One pooled client per process, created and closed in the app lifespan
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks=HTTP_CLIENT_EVENT_HOOKS,
+    )
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
+
+async def request_with_retry(client: httpx.AsyncClient, method: str, url: str, retries: int = None, **kwargs):
+    # Only idempotent calls are retried unless the caller asks otherwise
+    if retries is None:
+        retries = HTTP_RETRIES if method.upper() in IDEMPOTENT_METHODS else 0
+    for attempt in range(retries + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code < 500 or attempt == retries:
+                return response
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
@@ -1,10 +1,33 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from .metrics import MetricsMiddleware, monitor_event_loop_lag, metrics_response, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 from . import models
-from .routers import reservations, admin
+from .routers import reservations, admin, villa_cache, quotes
+from .http_client import create_http_client
 from dotenv import load_dotenv
+import asyncio
 
 load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    instrument_engine(models.engine)
+    if models.replica_engine is not None:
+        instrument_engine(models.replica_engine, "replica")
+    async with models.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(models.create_indexes)
+        await conn.run_sync(models.create_constraints)
+    app.state.http_client = create_http_client()
+    yield
+    lag_monitor.cancel()
+    await app.state.http_client.aclose()
+    await models.engine.dispose()
+    if models.replica_engine is not None:
+        await models.replica_engine.dispose()
+
 app = FastAPI(
     title="Reservation Service",
     description="Manages villa reservations, including creation and retrieval",
@@ -17,23 +40,39 @@ app = FastAPI(
         {
             "name": "admin",
             "description": "Admin endpoints for managing reservations"
+        },
+        {
+            "name": "quotes",
+            "description": "Price quotes for many villas and date ranges at once"
+        },
+        {
+            "name": "villa-cache",
+            "description": "Internal endpoints for the cached villa details"
         }
-    ]
+    ],
+    lifespan=lifespan
 )
 
+# Added first so CORS stays outermost
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-models.Base.metadata.create_all(bind=models.engine)
-
 app.include_router(reservations.router, prefix="/reservations", tags=["reservations"])
 app.include_router(admin.router, prefix="/reservations/admin", tags=["admin"])
+app.include_router(quotes.router, prefix="/reservations/quotes", tags=["quotes"])
+app.include_router(villa_cache.router, prefix="/reservations/villa-cache", tags=["villa-cache"])
 
 @app.get("/", tags=["root"], summary="Root Endpoint of the Reservation Service")
 def read_root():
-    return {"message": "Reservation Service"}
\ No newline at end of file
+    return {"message": "Reservation Service"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
\ No newline at end of file
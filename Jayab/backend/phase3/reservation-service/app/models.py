@@ -1,16 +1,91 @@
-from sqlalchemy import Column, Integer, Float, Date
+from sqlalchemy import Column, Integer, Float, Date, Index, func, text, event
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from collections import OrderedDict
 from dotenv import load_dotenv
+import logging
 import os
+import time
 
 load_dotenv()
-DATABASE_URL = f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
+# DATABASE_URL overrides the Postgres settings, e.g. to point at SQLite for benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+# Optional hot standby for read-only handlers; unset means reads share the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# How long a client keeps reading from the primary after it commits, to cover replica lag
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+def engine_options(url: str):
+    # SQLite runs without a sized connection pool or server-side timeouts
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    }
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+replica_engine = create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)) if DATABASE_REPLICA_URL else None
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(bind=replica_engine or engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+class RecentWrites:
+    """Clients that committed within the read-your-writes window, oldest first.
+
+    Tracked per worker; a client whose next read lands on another worker may see
+    replica lag, which is bounded by the replica's own delay.
+    """
+
+    def __init__(self, window: float, max_size: int = 100000):
+        self.window = window
+        self.max_size = max_size
+        self._until = OrderedDict()  # client key -> monotonic deadline
+
+    def mark(self, key: str):
+        self._until[key] = time.monotonic() + self.window
+        self._until.move_to_end(key)
+        while len(self._until) > self.max_size:
+            self._until.popitem(last=False)
+
+    def active(self, key: str):
+        until = self._until.get(key)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[key]
+            return False
+        return True
+
+recent_writes = RecentWrites(DB_READ_YOUR_WRITES_SECONDS)
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _pin_client_to_primary(session):
+    # Only request sessions carry a client key; background sessions never pin anyone
+    if session.info.pop("wrote", False) and "client" in session.info:
+        recent_writes.mark(session.info["client"])
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
 class Reservation(Base):
     __tablename__ = "reservations"
     id = Column(Integer, primary_key=True, index=True)
@@ -19,4 +94,73 @@ class Reservation(Base):
     check_in_date = Column(Date, nullable=False)
     check_out_date = Column(Date, nullable=False)
     people_count = Column(Integer, nullable=False)
-    total_price = Column(Float, nullable=False)
\ No newline at end of file
+    total_price = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Keyset pagination by id within a user's or a villa's reservations
+        Index("ix_reservations_user_id", "user_id", "id"),
+        Index("ix_reservations_villa_id", "villa_id", "id"),
+        # Date-window calendar lookups; check_out_date makes the scan index-only
+        Index("ix_reservations_villa_check_in", "villa_id", "check_in_date", "check_out_date"),
+    )
+
+def stay_overlaps(dialect_name: str, check_in_date, check_out_date):
+    # On Postgres use the range operator so the GiST index on the stay range applies
+    if dialect_name == "postgresql":
+        stay = func.daterange(Reservation.check_in_date, Reservation.check_out_date)
+        return stay.op("&&")(func.daterange(check_in_date, check_out_date))
+    return (Reservation.check_in_date < check_out_date) & (Reservation.check_out_date > check_in_date)
+
+def create_indexes(connection):
+    # create_all skips existing tables, so add indexes introduced after the table was created
+    for index in Reservation.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_reservations_stay ON reservations "
+            "USING gist (daterange(check_in_date, check_out_date))"
+        ))
+
+# Whether the database rejects overlapping stays itself; until it does, bookings pre-check
+_overlap_constraint_enforced = False
+
+def overlap_constraint_enforced():
+    return _overlap_constraint_enforced
+
+def find_overlapping_stays(connection, limit: int = 20):
+    """Pairs of reservation ids whose stays overlap on the same villa, e.g. left by the old racy check."""
+    return connection.execute(text(
+        "SELECT a.id, b.id FROM reservations a JOIN reservations b "
+        "ON a.villa_id = b.villa_id AND a.id < b.id "
+        "AND daterange(a.check_in_date, a.check_out_date) && daterange(b.check_in_date, b.check_out_date) "
+        "ORDER BY a.id, b.id LIMIT :limit"
+    ), {"limit": limit}).all()
+
+def create_constraints(connection):
+    # Non-overlapping stays per villa, enforced by the database instead of a read-then-insert check
+    global _overlap_constraint_enforced
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    exists = connection.execute(text("SELECT 1 FROM pg_constraint WHERE conname = 'reservations_no_overlap'")).first()
+    if not exists:
+        # Existing overlaps would make the ALTER fail and the service crash on boot. Report
+        # them instead, keep the pre-check, and add the constraint once they are resolved.
+        overlaps = find_overlapping_stays(connection)
+        if overlaps:
+            logger.warning(
+                "Not adding reservations_no_overlap: existing reservations overlap (id pairs, first %d): %s",
+                len(overlaps), ", ".join(f"{a}/{b}" for a, b in overlaps),
+            )
+            return
+        try:
+            # A savepoint, so a booking that slips in meanwhile cannot abort the startup transaction
+            with connection.begin_nested():
+                connection.execute(text(
+                    "ALTER TABLE reservations ADD CONSTRAINT reservations_no_overlap "
+                    "EXCLUDE USING gist (villa_id WITH =, daterange(check_in_date, check_out_date) WITH &&)"
+                ))
+        except DBAPIError as e:
+            logger.warning("Not adding reservations_no_overlap: %s", e.orig)
+            return
+    _overlap_constraint_enforced = True
\ No newline at end of file
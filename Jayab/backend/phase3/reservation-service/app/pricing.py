@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from itertools import accumulate
+from dotenv import load_dotenv
+import calendar
+import os
+
+load_dotenv()
+# Python weekdays; Thursday and Friday are the local weekend
+PRICING_WEEKEND_DAYS = {int(day) for day in os.getenv("PRICING_WEEKEND_DAYS", "3,4").split(",") if day.strip()}
+PRICING_WEEKEND_MULTIPLIER = float(os.getenv("PRICING_WEEKEND_MULTIPLIER", "1.0"))
+PRICING_HOLIDAY_MULTIPLIER = float(os.getenv("PRICING_HOLIDAY_MULTIPLIER", "1.0"))
+# Comma-separated ISO dates, e.g. "2027-03-20,2027-03-21"
+PRICING_HOLIDAYS = {date.fromisoformat(day.strip()) for day in os.getenv("PRICING_HOLIDAYS", "").split(",") if day.strip()}
+# Comma-separated MM-DD:MM-DD:multiplier ranges, inclusive, may wrap the new year, e.g. "06-01:08-31:1.3"
+PRICING_SEASONS = os.getenv("PRICING_SEASONS", "")
+PRICING_CALENDAR_DAYS = int(os.getenv("PRICING_CALENDAR_DAYS", "730"))
+# Longest stay that can be quoted or booked
+PRICING_MAX_STAY_NIGHTS = int(os.getenv("PRICING_MAX_STAY_NIGHTS", "365"))
+
+def parse_seasons(spec: str):
+    seasons = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        start, end, multiplier = part.strip().split(":")
+        start_month, start_day = map(int, start.split("-"))
+        end_month, end_day = map(int, end.split("-"))
+        seasons.append(((start_month, start_day), (end_month, end_day), float(multiplier)))
+    return seasons
+
+SEASONS = parse_seasons(PRICING_SEASONS)
+
+def season_multiplier(day: date):
+    key = (day.month, day.day)
+    for start, end, multiplier in SEASONS:
+        if (start <= key <= end) if start <= end else (key >= start or key <= end):
+            return multiplier
+    return 1.0
+
+def regular_multiplier(day: date):
+    """Rate multiplier for the night starting on ``day``, ignoring holidays."""
+    rate = PRICING_WEEKEND_MULTIPLIER if day.weekday() in PRICING_WEEKEND_DAYS else 1.0
+    return rate * season_multiplier(day)
+
+def night_multiplier(day: date):
+    """Rate multiplier for the night starting on ``day``; a holiday rate replaces the weekend rate."""
+    if day in PRICING_HOLIDAYS:
+        return PRICING_HOLIDAY_MULTIPLIER * season_multiplier(day)
+    return regular_multiplier(day)
+
+def holiday_adjustment(check_in_date: date, check_out_date: date):
+    # What the holidays inside the stay add on top of their regular rate
+    return sum(
+        night_multiplier(day) - regular_multiplier(day)
+        for day in PRICING_HOLIDAYS if check_in_date <= day < check_out_date
+    )
+
+class YearLayouts:
+    """Prefix sums of regular multipliers for a whole year, shared by years with the same layout.
+
+    Weekday and seasonal rates only depend on the weekday of 1 January and whether the
+    year is a leap year, so 14 layouts cover every year and any stay is summed a year
+    at a time rather than a night at a time.
+    """
+
+    def __init__(self):
+        self._prefix = {}  # (weekday of Jan 1, leap) -> prefix sums over the year's days
+
+    def prefix(self, year: int):
+        first = date(year, 1, 1)
+        key = (first.weekday(), calendar.isleap(year))
+        prefix = self._prefix.get(key)
+        if prefix is None:
+            days = (date(year + 1, 1, 1) - first).days if year < date.max.year else 365
+            prefix = list(accumulate((regular_multiplier(first + timedelta(days=n)) for n in range(days)), initial=0.0))
+            self._prefix[key] = prefix
+        return prefix
+
+    def factor(self, check_in_date: date, check_out_date: date):
+        total = 0.0
+        day = check_in_date
+        while day < check_out_date:
+            prefix = self.prefix(day.year)
+            start = day.timetuple().tm_yday - 1
+            end = len(prefix) - 1 if check_out_date.year > day.year else check_out_date.timetuple().tm_yday - 1
+            total += prefix[end] - prefix[start]
+            if check_out_date.year == day.year:
+                break
+            day = date(day.year + 1, 1, 1)
+        return total + holiday_adjustment(check_in_date, check_out_date)
+
+year_layouts = YearLayouts()
+
+class PriceCalendar:
+    """Prefix sums of nightly multipliers over a rolling window starting today.
+
+    The rules are the same for every villa, so one calendar serves them all: a stay
+    costs its nightly rate times the sum of multipliers over its nights, which is a
+    difference of two prefix sums. Stays outside the window are summed a year at a time.
+    """
+
+    def __init__(self, days: int):
+        self.days = days
+        self.start = None
+        self._prefix = [0.0]
+
+    def nights_factor(self, check_in_date: date, check_out_date: date):
+        today = date.today()
+        if self.start != today:
+            self._build(today)
+        first = (check_in_date - self.start).days
+        last = (check_out_date - self.start).days
+        if 0 <= first and last <= self.days:
+            return self._prefix[last] - self._prefix[first]
+        return year_layouts.factor(check_in_date, check_out_date)
+
+    def _build(self, start: date):
+        multipliers = (night_multiplier(start + timedelta(days=n)) for n in range(self.days))
+        self._prefix = list(accumulate(multipliers, initial=0.0))
+        self.start = start
+
+price_calendar = PriceCalendar(PRICING_CALENDAR_DAYS)
+
+def quote_total(villa: dict, check_in_date: date, check_out_date: date, people_count: int):
+    extra_people = max(0, people_count - villa["base_capacity"])
+    nightly = villa["base_price_per_night"] + extra_people * villa["extra_person_price"]
+    return round(nightly * price_calendar.nights_factor(check_in_date, check_out_date), 2)
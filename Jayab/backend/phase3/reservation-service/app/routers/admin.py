@@ -1,45 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from ..models import Reservation
-from ..dependencies import get_db, get_current_admin
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Reservation, ReadSessionLocal
+from ..dependencies import get_db, get_read_db, get_current_admin
+from ..http_client import get_http_client
+from ..availability import availability_cache
+from .reservations import ReservationResponse, attach_villas
+from typing import Literal, Optional
+import httpx
+import base64
+import csv
+import io
+import json
 from datetime import date
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 VILLA_SERVICE_URL = os.getenv("VILLA_SERVICE_URL")
+DEFAULT_PAGE_SIZE = int(os.getenv("RESERVATION_DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("RESERVATION_MAX_PAGE_SIZE", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("RESERVATION_EXPORT_BATCH_SIZE", "1000"))
+EXPORT_COLUMNS = [column.key for column in Reservation.__table__.columns]
 router = APIRouter()
 
-class ReservationResponse(BaseModel):
-    id: int
-    user_id: int
-    villa_id: int
-    check_in_date: date
-    check_out_date: date
-    people_count: int
-    total_price: float
+def encode_cursor(reservation_id: int):
+    return base64.urlsafe_b64encode(json.dumps({"id": reservation_id}).encode()).decode()
 
-    class Config:
-        orm_mode = True
+def decode_cursor(cursor: str):
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_filters(query, villa_id: Optional[int], from_date: Optional[date], to_date: Optional[date]):
+    # from_date/to_date select stays that overlap the window
+    if from_date and to_date and from_date >= to_date:
+        raise HTTPException(status_code=400, detail="Invalid dates: from_date must be before to_date")
+    if villa_id is not None:
+        query = query.filter(Reservation.villa_id == villa_id)
+    if from_date:
+        query = query.filter(Reservation.check_out_date > from_date)
+    if to_date:
+        query = query.filter(Reservation.check_in_date < to_date)
+    return query
+
+async def paginate(db: AsyncSession, query, response: Response, limit: int, cursor: Optional[str]):
+    # Keyset pagination on id, newest first, so deep pages cost the same as the first one
+    if cursor:
+        query = query.filter(Reservation.id < decode_cursor(cursor))
+    result = await db.execute(query.order_by(Reservation.id.desc()).limit(limit + 1))
+    reservations = result.scalars().all()
+    if len(reservations) > limit:
+        reservations = reservations[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(reservations[-1].id)
+    return reservations
 
 @router.get("/all", response_model=list[ReservationResponse])
-async def list_all_reservations(db: Session = Depends(get_db), admin: dict = Depends(get_current_admin)):
-    reservations = db.query(Reservation).all()
+async def list_all_reservations(
+    response: Response,
+    villa_id: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include: Optional[Literal["villa"]] = None,
+    db: AsyncSession = Depends(get_read_db),
+    admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
+    query = apply_filters(select(Reservation), villa_id, from_date, to_date)
+    reservations = await paginate(db, query, response, limit, cursor)
+    if include == "villa":
+        return await attach_villas(client, reservations)
     return reservations
 
 @router.get("/user/{user_id}", response_model=list[ReservationResponse])
-async def list_user_reservations(user_id: int, db: Session = Depends(get_db), admin: dict = Depends(get_current_admin)):
-    reservations = db.query(Reservation).filter(Reservation.user_id == user_id).all()
-    if not reservations:
+async def list_user_reservations(
+    user_id: int,
+    response: Response,
+    villa_id: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include: Optional[Literal["villa"]] = None,
+    db: AsyncSession = Depends(get_read_db),
+    admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
+    query = apply_filters(select(Reservation).filter(Reservation.user_id == user_id), villa_id, from_date, to_date)
+    reservations = await paginate(db, query, response, limit, cursor)
+    if not reservations and cursor is None:
         raise HTTPException(status_code=404, detail="No reservations found for this user")
+    if include == "villa":
+        return await attach_villas(client, reservations)
     return reservations
 
+def format_ndjson(row):
+    return json.dumps({key: value.isoformat() if isinstance(value, date) else value for key, value in row.items()}) + "\n"
+
+def format_csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+async def export_rows(query, export_format: str):
+    # The request-scoped session is closed before the body streams, so the export owns its own.
+    # stream() with yield_per keeps a server-side cursor open and pulls one batch at a time.
+    if export_format == "csv":
+        yield format_csv_line(EXPORT_COLUMNS)
+    async with ReadSessionLocal() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            # A full export legitimately outlives the per-statement timeout
+            await db.execute(text("SET LOCAL statement_timeout = 0"))
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for batch in result.mappings().partitions():
+            if export_format == "csv":
+                yield "".join(format_csv_line([row[key] for key in EXPORT_COLUMNS]) for row in batch)
+            else:
+                yield "".join(format_ndjson(row) for row in batch)
+
+@router.get("/export")
+async def export_reservations(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    villa_id: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    admin: dict = Depends(get_current_admin)
+):
+    # Plain columns rather than ORM objects so nothing accumulates in an identity map
+    query = apply_filters(select(*Reservation.__table__.columns), villa_id, from_date, to_date).order_by(Reservation.id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=reservations.{format}"}
+    )
+
 @router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_reservation(reservation_id: int, db: Session = Depends(get_db), admin: dict = Depends(get_current_admin)):
-    reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+async def delete_reservation(reservation_id: int, db: AsyncSession = Depends(get_db), admin: dict = Depends(get_current_admin)):
+    result = await db.execute(select(Reservation).filter(Reservation.id == reservation_id))
+    reservation = result.scalars().first()
     if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    db.delete(reservation)
-    db.commit()
+    await db.delete(reservation)
+    await db.commit()
+    availability_cache.invalidate(reservation.villa_id)
     return  {"detail": "Reservation deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, model_validator
+from ..http_client import get_http_client
+from ..pricing import quote_total, PRICING_MAX_STAY_NIGHTS
+from ..villa_cache import villa_cache
+from datetime import date
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+MAX_QUOTES_PER_REQUEST = int(os.getenv("MAX_QUOTES_PER_REQUEST", "10000"))
+router = APIRouter()
+
+class QuoteItem(BaseModel):
+    villa_id: int
+    check_in_date: date
+    check_out_date: date
+    people_count: int
+
+    @model_validator(mode="after")
+    def check_stay_length(self):
+        # Reversed dates are reported per item; only unbounded stays reject the request
+        if (self.check_out_date - self.check_in_date).days > PRICING_MAX_STAY_NIGHTS:
+            raise ValueError(f"Stays are limited to {PRICING_MAX_STAY_NIGHTS} nights")
+        return self
+
+class QuoteRequest(BaseModel):
+    # Oversized batches are rejected while parsing, before any item is built
+    items: list[QuoteItem] = Field(max_length=MAX_QUOTES_PER_REQUEST)
+
+class QuoteResult(BaseModel):
+    villa_id: int
+    check_in_date: date
+    check_out_date: date
+    people_count: int
+    nights: int
+    total_price: Optional[float] = None
+    error: Optional[str] = None
+
+def quote_item(item: QuoteItem, villas: dict):
+    nights = (item.check_out_date - item.check_in_date).days
+    result = {**item.model_dump(), "nights": max(nights, 0)}
+    villa = villas.get(item.villa_id)
+    if nights <= 0:
+        return {**result, "error": "Invalid dates: check-in must be before check-out"}
+    if villa is None:
+        return {**result, "error": "Villa not found"}
+    if item.people_count > villa["maximum_capacity"]:
+        return {**result, "error": "People count exceeds maximum capacity"}
+    return {**result, "total_price": quote_total(villa, item.check_in_date, item.check_out_date, item.people_count)}
+
+@router.post("/", response_model=list[QuoteResult])
+async def create_quotes(request: QuoteRequest, client: httpx.AsyncClient = Depends(get_http_client)):
+    # Errors are reported per item so one bad tuple does not fail a whole results page
+    try:
+        villas = await villa_cache.get_many(client, {item.villa_id for item in request.items})
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail="Failed to fetch villa details")
+    return [quote_item(item, villas) for item in request.items]
@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from ..models import Reservation
-from ..dependencies import get_db, get_current_user
-from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from ..models import Reservation, stay_overlaps, overlap_constraint_enforced
+from ..dependencies import get_db, get_read_db, get_current_user
+from ..http_client import get_http_client
+from ..villa_cache import villa_cache
+from ..pricing import quote_total, PRICING_MAX_STAY_NIGHTS
+from ..availability import availability_cache, occupancy, encode_bitmap, encode_runs
+from datetime import date, timedelta
+from typing import Literal, Optional
 import httpx
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
-VILLA_SERVICE_URL = os.getenv("VILLA_SERVICE_URL")
+EXCLUSION_VIOLATION = "23P01"
+OVERLAP_DETAIL = "Reservation dates overlap with an existing reservation"
+CALENDAR_DEFAULT_DAYS = int(os.getenv("CALENDAR_DEFAULT_DAYS", "365"))
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", "730"))
+MAX_BOOKED_VILLA_IDS = int(os.getenv("MAX_BOOKED_VILLA_IDS", "100"))
 router = APIRouter()
 
 class ReservationCreate(BaseModel):
@@ -18,6 +29,14 @@ class ReservationCreate(BaseModel):
     check_out_date: date
     people_count: int
 
+class VillaSummary(BaseModel):
+    id: int
+    title: str
+    city: str
+    address: str
+    images: Optional[str] = None
+    rating: float
+
 class ReservationResponse(BaseModel):
     id: int
     user_id: int
@@ -26,50 +45,68 @@ class ReservationResponse(BaseModel):
     check_out_date: date
     people_count: int
     total_price: float
+    villa: Optional[VillaSummary] = None
 
-    class Config:
-        orm_mode = True
+    # attach_villas validates ORM rows directly, outside FastAPI's response_model handling
+    model_config = ConfigDict(from_attributes=True)
 
 class ReservationDateRange(BaseModel):
     check_in_date: date
     check_out_date: date
 
+class VillaCalendar(BaseModel):
+    villa_id: int
+    start: date
+    days: int
+    format: Literal["rle", "bitmap"]
+    # rle: [booked (0 or 1), length] pairs covering the window in order
+    runs: Optional[list[list[int]]] = None
+    # bitmap: base64 of one bit per day, day 0 in the least significant bit of the first byte
+    bitmap: Optional[str] = None
+
+async def attach_villas(client: httpx.AsyncClient, reservations):
+    # One batched villa lookup for the whole page instead of a call per row
+    try:
+        villas = await villa_cache.get_many(client, {reservation.villa_id for reservation in reservations})
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail="Failed to fetch villa details")
+    return [
+        ReservationResponse.model_validate(reservation).model_copy(update={
+            "villa": VillaSummary.model_validate(villas[reservation.villa_id]) if reservation.villa_id in villas else None
+        }) for reservation in reservations
+    ]
+
 @router.post("/", response_model=ReservationResponse)
-async def create_reservation(reservation: ReservationCreate, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+async def create_reservation(reservation: ReservationCreate, db: AsyncSession = Depends(get_db), user: dict = Depends(get_current_user), client: httpx.AsyncClient = Depends(get_http_client)):
     # Validate dates
     if reservation.check_in_date >= reservation.check_out_date:
         raise HTTPException(status_code=400, detail="Invalid dates: check-in must be before check-out")
+    if (reservation.check_out_date - reservation.check_in_date).days > PRICING_MAX_STAY_NIGHTS:
+        raise HTTPException(status_code=400, detail=f"Stays are limited to {PRICING_MAX_STAY_NIGHTS} nights")
 
     # Check villa exists
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{VILLA_SERVICE_URL}/villas/{reservation.villa_id}")
-            if response.status_code != 200:
-                raise HTTPException(status_code=404, detail="Villa not found")
-            villa = response.json()
-    except Exception as e:
+        villa = await villa_cache.get(client, reservation.villa_id)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail="Failed to fetch villa details")
+    if villa is None:
+        raise HTTPException(status_code=404, detail="Villa not found")
 
     # Validate people count
     if reservation.people_count > villa["maximum_capacity"]:
         raise HTTPException(status_code=400, detail="People count exceeds maximum capacity")
 
-    # Check for overlapping reservations
-    overlapping = db.query(Reservation).filter(
-        Reservation.villa_id == reservation.villa_id,
-        Reservation.check_in_date < reservation.check_out_date,
-        Reservation.check_out_date > reservation.check_in_date
-    ).first()
-    if overlapping:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Reservation dates overlap with an existing reservation"
-        )
+    # Postgres enforces non-overlap with an exclusion constraint; without it, fall back to a pre-check
+    if not overlap_constraint_enforced():
+        result = await db.execute(select(Reservation.id).filter(
+            Reservation.villa_id == reservation.villa_id,
+            stay_overlaps(db.get_bind().dialect.name, reservation.check_in_date, reservation.check_out_date)
+        ).limit(1))
+        if result.first():
+            raise HTTPException(status_code=409, detail=OVERLAP_DETAIL)
 
-    # Calculate total price
-    days = (reservation.check_out_date - reservation.check_in_date).days
-    extra_people = max(0, reservation.people_count - villa["base_capacity"])
-    total_price = (villa["base_price_per_night"] * days) + (extra_people * villa["extra_person_price"] * days)
+    # Calculate total price with the same rules as the quote endpoint
+    total_price = quote_total(villa, reservation.check_in_date, reservation.check_out_date, reservation.people_count)
 
     # Create reservation
     db_reservation = Reservation(
@@ -81,39 +118,104 @@ async def create_reservation(reservation: ReservationCreate, db: Session = Depen
         total_price=total_price
     )
     db.add(db_reservation)
-    db.commit()
-    db.refresh(db_reservation)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if getattr(e.orig, "sqlstate", None) == EXCLUSION_VIOLATION:
+            raise HTTPException(status_code=409, detail=OVERLAP_DETAIL)
+        raise
+    availability_cache.invalidate(reservation.villa_id)
     return db_reservation
 
 @router.get("/", response_model=list[ReservationResponse])
-async def list_reservations(db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
-    reservations = db.query(Reservation).filter(Reservation.user_id == user["id"]).all()
+async def list_reservations(include: Optional[Literal["villa"]] = None, db: AsyncSession = Depends(get_read_db), user: dict = Depends(get_current_user), client: httpx.AsyncClient = Depends(get_http_client)):
+    result = await db.execute(select(Reservation).filter(Reservation.user_id == user["id"]))
+    reservations = result.scalars().all()
+    if include == "villa":
+        return await attach_villas(client, reservations)
     return reservations
 
+def parse_villa_ids(villa_ids: str):
+    try:
+        ids = {int(part) for part in villa_ids.split(",") if part.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="villa_ids must be a comma-separated list of integers")
+    if len(ids) > MAX_BOOKED_VILLA_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BOOKED_VILLA_IDS} villa ids per request")
+    return ids
+
+@router.get("/booked-villas", response_model=list[int])
+async def list_booked_villas(
+    check_in_date: date,
+    check_out_date: date,
+    villa_ids: str,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user),
+):
+    # Answers for the caller's candidate villas only, so the response and the IN list stay bounded
+    if check_in_date >= check_out_date:
+        raise HTTPException(status_code=400, detail="Invalid dates: check-in must be before check-out")
+    ids = parse_villa_ids(villa_ids)
+    if not ids:
+        return []
+    result = await db.execute(
+        select(distinct(Reservation.villa_id)).filter(
+            Reservation.villa_id.in_(ids),
+            stay_overlaps(db.get_bind().dialect.name, check_in_date, check_out_date),
+        )
+    )
+    return result.scalars().all()
+
 @router.get("/{reservation_id}", response_model=ReservationResponse)
-async def get_reservation(reservation_id: int, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
-    reservation = db.query(Reservation).filter(
+async def get_reservation(reservation_id: int, db: AsyncSession = Depends(get_read_db), user: dict = Depends(get_current_user)):
+    result = await db.execute(select(Reservation).filter(
         Reservation.id == reservation_id,
         Reservation.user_id == user["id"]
-    ).first()
+    ))
+    reservation = result.scalars().first()
     if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
     return reservation
 
+@router.get("/villa/{villa_id}/calendar", response_model=VillaCalendar)
+async def get_villa_calendar(
+    villa_id: int,
+    start: Optional[date] = None,
+    days: int = Query(CALENDAR_DEFAULT_DAYS, ge=1, le=CALENDAR_MAX_DAYS),
+    format: Literal["rle", "bitmap"] = "rle",
+    db: AsyncSession = Depends(get_db)
+):
+    # Only stays overlapping the window are read; an unknown villa is simply free every night.
+    # Reads stay on the primary: a lagging replica would refill the cache right after a booking invalidates it.
+    start = start or date.today()
+    nights = availability_cache.get(villa_id, start, days)
+    if nights is None:
+        result = await db.execute(select(Reservation.check_in_date, Reservation.check_out_date).filter(
+            Reservation.villa_id == villa_id,
+            Reservation.check_in_date < start + timedelta(days=days),
+            Reservation.check_out_date > start
+        ))
+        nights = occupancy(start, days, result.all())
+        availability_cache.put(villa_id, start, days, nights)
+    if format == "bitmap":
+        return VillaCalendar(villa_id=villa_id, start=start, days=days, format=format, bitmap=encode_bitmap(nights))
+    return VillaCalendar(villa_id=villa_id, start=start, days=days, format=format, runs=encode_runs(nights))
+
 @router.get("/villa/{villa_id}/dates", response_model=list[ReservationDateRange])
-async def get_villa_reservation_dates(villa_id: int, db: Session = Depends(get_db)):
+async def get_villa_reservation_dates(villa_id: int, db: AsyncSession = Depends(get_read_db), client: httpx.AsyncClient = Depends(get_http_client)):
     
     # Verify villa exists
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{VILLA_SERVICE_URL}/villas/{villa_id}")
-            if response.status_code != 200:
-                raise HTTPException(status_code=404, detail="Villa not found")
-    except Exception as e:
+        villa = await villa_cache.get(client, villa_id)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail="Failed to fetch villa details")
+    if villa is None:
+        raise HTTPException(status_code=404, detail="Villa not found")
 
     # Get all reservations for the villa
-    reservations = db.query(Reservation).filter(Reservation.villa_id == villa_id).all()
+    result = await db.execute(select(Reservation).filter(Reservation.villa_id == villa_id))
+    reservations = result.scalars().all()
     date_ranges = [
         ReservationDateRange(
             check_in_date=reservation.check_in_date,
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from ..villa_cache import villa_cache
+from ..dependencies import get_current_admin
+
+router = APIRouter()
+
+@router.post("/{villa_id}/invalidate")
+async def invalidate_villa(villa_id: int, admin: dict = Depends(get_current_admin)):
+    villa_cache.invalidate(villa_id)
+    return {"message": "Villa cache entry invalidated"}
+
+@router.get("/stats")
+async def get_villa_cache_stats(admin: dict = Depends(get_current_admin)):
+    return villa_cache.stats()
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from .http_client import request_with_retry
+from dotenv import load_dotenv
+import asyncio
+import httpx
+import os
+import time
+
+load_dotenv()
+VILLA_SERVICE_URL = os.getenv("VILLA_SERVICE_URL")
+VILLA_CACHE_TTL = float(os.getenv("VILLA_CACHE_TTL", "60"))
+VILLA_CACHE_STALE_TTL = float(os.getenv("VILLA_CACHE_STALE_TTL", "300"))
+VILLA_CACHE_SIZE = int(os.getenv("VILLA_CACHE_SIZE", "1000"))
+# Matches the ids cap of villa-service's batch lookup
+VILLA_BATCH_SIZE = 100
+
+class VillaCache:
+    """LRU cache of villa details with stale-while-revalidate refresh.
+
+    Entries younger than ``ttl`` are served as-is. Entries up to ``stale_ttl``
+    older than that are served while a background refresh runs. Concurrent
+    misses for one villa share a single request to villa-service.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # villa_id -> (fetched_at, villa)
+        self._inflight = {}  # villa_id -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, client: httpx.AsyncClient, villa_id: int):
+        """Return the villa as a dict, or None if villa-service does not know it."""
+        entry = self._entries.get(villa_id)
+        if entry:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(villa_id)
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(villa_id)
+                self._refresh(client, villa_id)
+                return entry[1]
+        self.misses += 1
+        # Shield so one cancelled caller does not cancel the fetch the others are waiting on
+        return await asyncio.shield(self._refresh(client, villa_id))
+
+    async def get_many(self, client: httpx.AsyncClient, villa_ids):
+        """Return {villa_id: villa} for the given ids, fetching every miss in batched calls."""
+        found, missing = {}, []
+        now = time.monotonic()
+        for villa_id in set(villa_ids):
+            entry = self._entries.get(villa_id)
+            if entry and now - entry[0] < self.ttl:
+                self.hits += 1
+                found[villa_id] = entry[1]
+            else:
+                missing.append(villa_id)
+        self.misses += len(missing)
+        batches = [missing[i:i + VILLA_BATCH_SIZE] for i in range(0, len(missing), VILLA_BATCH_SIZE)]
+        responses = await asyncio.gather(*(
+            request_with_retry(client, "GET", f"{VILLA_SERVICE_URL}/villas/", params={"ids": ",".join(map(str, batch))})
+            for batch in batches
+        ))
+        for response in responses:
+            response.raise_for_status()
+            for villa in response.json():
+                self._store(villa["id"], villa)
+                found[villa["id"]] = villa
+        return found
+
+    def invalidate(self, villa_id: int):
+        self._entries.pop(villa_id, None)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+    def _refresh(self, client: httpx.AsyncClient, villa_id: int):
+        task = self._inflight.get(villa_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(client, villa_id))
+            self._inflight[villa_id] = task
+            task.add_done_callback(lambda done: self._finish(villa_id, done))
+        return task
+
+    def _finish(self, villa_id: int, task: asyncio.Task):
+        self._inflight.pop(villa_id, None)
+        # Background refreshes have no awaiter; mark their failures as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, client: httpx.AsyncClient, villa_id: int):
+        response = await request_with_retry(client, "GET", f"{VILLA_SERVICE_URL}/villas/{villa_id}")
+        if response.status_code == 404:
+            self.invalidate(villa_id)
+            return None
+        response.raise_for_status()
+        villa = response.json()
+        self._store(villa_id, villa)
+        return villa
+
+    def _store(self, villa_id: int, villa: dict):
+        self._entries[villa_id] = (time.monotonic(), villa)
+        self._entries.move_to_end(villa_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+villa_cache = VillaCache(VILLA_CACHE_TTL, VILLA_CACHE_STALE_TTL, VILLA_CACHE_SIZE)
@@ -1,22 +1,50 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from .models import SessionLocal, User
+from concurrent.futures import ThreadPoolExecutor
+from .models import SessionLocal, ReadSessionLocal, User, recent_writes, replica_engine, user_key
+from .redis_client import redis_client
+from .user_cache import user_cache
 from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
+import redis
+import uuid
 
 load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_REVOCATION_CHECK = os.getenv("TOKEN_REVOCATION_CHECK", "true").lower() == "true"
 bearer_scheme = HTTPBearer(scheme_name="BearerAuth", description="Enter the JWT token obtained from /auth/login/verify")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# bcrypt releases the GIL, so a small dedicated thread pool keeps hashing off the event loop
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending_password_jobs = 0
 
-def get_db():
-    db = SessionLocal()
+def client_key(request: Request):
+    # The bearer token follows a client across requests; anonymous callers fall back to their address
+    identity = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def get_db(request: Request):
+    db = SessionLocal(info={"client": client_key(request)})
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    # Read-only handlers go to the replica unless this client committed moments ago
+    session_factory = SessionLocal if recent_writes.active(client_key(request)) else ReadSessionLocal
+    db = session_factory()
     try:
         yield db
     finally:
@@ -28,33 +56,108 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def run_password_job(func, *args):
+    # Reject instead of queueing without bound when signups arrive faster than the pool can hash
+    global _pending_password_jobs
+    if _pending_password_jobs >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+    _pending_password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        _pending_password_jobs -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict):
+    # Claims carry id and role so other services can authorize without calling back here
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": int(now.timestamp()), "jti": uuid.uuid4().hex})
     if "sub" in to_encode:
         to_encode["sub"] = str(to_encode["sub"])
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
+def revocation_unavailable():
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token revocation unavailable, try again later", headers={"Retry-After": "1"})
+
+def revoke_token(payload: dict):
+    jti = payload.get("jti")
+    if jti is None:
+        # Tokens issued before jti was added can only be revoked along with the user's others
+        revoke_user_tokens(payload["sub"])
+        return
+    ttl = max(1, int(payload["exp"] - datetime.now(timezone.utc).timestamp()))
+    try:
+        redis_client.setex(f"revoked:jti:{jti}", ttl, 1)
+    except redis.RedisError:
+        raise revocation_unavailable()
+
+def revoke_user_tokens(user_id: int):
+    # Every token issued up to now for this user is rejected until it would have expired anyway
+    now = int(datetime.now(timezone.utc).timestamp())
+    try:
+        redis_client.setex(f"revoked:user:{user_id}", ACCESS_TOKEN_EXPIRE_MINUTES * 60, now)
+    except redis.RedisError:
+        raise revocation_unavailable()
+
+def is_token_revoked(payload: dict):
+    # Fails closed: while Redis is unreachable a revoked token cannot be told apart, so
+    # requests are refused with 503 rather than honoured
+    if not TOKEN_REVOCATION_CHECK:
+        return False
+    try:
+        revoked_jti, revoked_before = redis_client.mget(f"revoked:jti:{payload.get('jti')}", f"revoked:user:{payload.get('sub')}")
+    except redis.RedisError:
+        raise revocation_unavailable()
+    if revoked_jti:
+        return True
+    return revoked_before is not None and payload.get("iat", 0) <= int(revoked_before)
+
+def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if is_token_revoked(payload):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    return payload
+
+def find_user(request: Request, user_id: int):
+    # Users written moments ago, e.g. by signup on another worker, may not have reached the
+    # replica yet, so a replica miss is confirmed on the primary before it becomes a 401
+    pinned = recent_writes.active(client_key(request)) or recent_writes.active(user_key(user_id))
+    with (SessionLocal if pinned else ReadSessionLocal)() as db:
+        user = db.query(User).filter(User.id == user_id).first()
+    if user is None and not pinned and replica_engine is not None:
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.id == user_id).first()
+    return user
+
+def get_current_user(request: Request, payload: dict = Depends(get_token_payload)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"Authenticate": "Bearer"},
     )
+    user_id: int = payload.get("sub")
+    if user_id is None:
+        raise credentials_exception
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        try:
-            user_id = int(user_id)
-        except ValueError:
-            raise credentials_exception
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(User).filter(User.id == user_id).first()
+        user_id = int(user_id)
+    except ValueError:
+        raise credentials_exception
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    user = find_user(request, user_id)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    user_cache.set(user)
     return user
\ No newline at end of file
@@ -1,10 +1,29 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from .metrics import MetricsMiddleware, monitor_event_loop_lag, metrics_response, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 from . import models
 from .routers import auth, users
+from .http_client import create_http_client
+from .rate_limit import ConcurrencyLimitMiddleware
+from .dependencies import password_executor
 from dotenv import load_dotenv
+import asyncio
 
 load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    instrument_engine(models.engine)
+    if models.replica_engine is not None:
+        instrument_engine(models.replica_engine, "replica")
+    app.state.http_client = create_http_client()
+    yield
+    lag_monitor.cancel()
+    await app.state.http_client.aclose()
+    password_executor.shutdown()
+
 app = FastAPI(
     title="User Service",
     description="Manages user authentication and registration",
@@ -14,15 +33,20 @@ app = FastAPI(
             "name": "auth",
             "description": "Endpoints for user login, registration, and verification"
         }
-    ]
+    ],
+    lifespan=lifespan
 )
 
+# Added first so CORS stays outermost and shed responses still carry CORS headers
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 models.Base.metadata.create_all(bind=models.engine)
@@ -32,4 +56,8 @@ app.include_router(users.router, prefix="/users", tags=["users"])
 
 @app.get("/", tags=["root"], summary="Root Endpoint of the User Service")
 def read_root():
-    return {"message": "User Service"}
\ No newline at end of file
+    return {"message": "User Service"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
\ No newline at end of file
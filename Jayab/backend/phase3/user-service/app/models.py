@@ -1,16 +1,99 @@
 from sqlalchemy import Column, Integer, String, Enum
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, Session
+from collections import OrderedDict
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
-DATABASE_URL = f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
-engine = create_engine(DATABASE_URL)
+# DATABASE_URL overrides the Postgres settings, e.g. to point at SQLite for benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+# Optional hot standby for read-only handlers; unset means reads share the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# How long a client keeps reading from the primary after it commits, to cover replica lag
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+def engine_options(url: str):
+    # SQLite runs without a sized connection pool or server-side timeouts
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+    }
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+replica_engine = create_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)) if DATABASE_REPLICA_URL else None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine or engine)
 Base = declarative_base()
 
+class RecentWrites:
+    """Clients that committed within the read-your-writes window, oldest first.
+
+    Tracked per worker; a client whose next read lands on another worker may see
+    replica lag, which is bounded by the replica's own delay.
+    """
+
+    def __init__(self, window: float, max_size: int = 100000):
+        self.window = window
+        self.max_size = max_size
+        self._until = OrderedDict()  # client key -> monotonic deadline
+
+    def mark(self, key: str):
+        self._until[key] = time.monotonic() + self.window
+        self._until.move_to_end(key)
+        while len(self._until) > self.max_size:
+            self._until.popitem(last=False)
+
+    def active(self, key: str):
+        until = self._until.get(key)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[key]
+            return False
+        return True
+
+recent_writes = RecentWrites(DB_READ_YOUR_WRITES_SECONDS)
+
+def user_key(user_id: int):
+    # Signup commits anonymously, so the new user's first authenticated read shares no
+    # client key with it; pinning by user id covers that hand-off
+    return f"user:{user_id}"
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+    written = {row.id for row in (*session.new, *session.dirty, *session.deleted) if isinstance(row, User)}
+    if written:
+        session.info.setdefault("written_users", set()).update(written)
+
+@event.listens_for(Session, "after_commit")
+def _pin_client_to_primary(session):
+    # Only request sessions carry a client key; background sessions never pin anyone
+    if session.info.pop("wrote", False) and "client" in session.info:
+        recent_writes.mark(session.info["client"])
+    for user_id in session.info.pop("written_users", ()):
+        recent_writes.mark(user_key(user_id))
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+    session.info.pop("written_users", None)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
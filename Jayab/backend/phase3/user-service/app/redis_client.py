@@ -0,0 +1,32 @@
+import redis
+import redis.asyncio
+from .metrics import observe_redis
+from dotenv import load_dotenv
+import os
+import time
+
+load_dotenv()
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that times each command; pipelines run as one unit and are not broken out."""
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            observe_redis(args[0], start)
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis(args[0], start)
+
+redis_client = InstrumentedRedis(host=os.getenv("REDIS_HOST"), port=REDIS_PORT, decode_responses=True)
+
+# Async client for handlers that run on the event loop; the sync one serves threadpool dependencies
+async_redis_client = InstrumentedAsyncRedis(host=os.getenv("REDIS_HOST"), port=REDIS_PORT, decode_responses=True)
\ No newline at end of file
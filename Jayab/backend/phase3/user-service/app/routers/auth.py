@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from ..models import User
-from ..dependencies import get_db, get_password_hash, create_access_token
+from ..dependencies import get_db, get_password_hash_async, create_access_token, get_token_payload, revoke_token
+from ..http_client import get_http_client, request_with_retry
+from ..rate_limit import enforce_rate_limit
+from ..redis_client import async_redis_client
 import httpx
 from dotenv import load_dotenv
 import os
@@ -29,57 +33,85 @@ class LoginVerifyRequest(BaseModel):
     phone_number: str
     otp: str
 
+# The handlers below are async, so their blocking queries run on the threadpool. Each
+# helper closes the session when done, returning its connection to the pool before the
+# handler awaits the OTP service; loaded attributes stay readable on the detached rows.
+def find_registration_conflict(db: Session, phone_number: str, national_code: str):
+    try:
+        if db.query(User.id).filter(User.phone_number == phone_number).first():
+            return "Phone number already registered"
+        if db.query(User.id).filter(User.national_code == national_code).first():
+            return "National code already registered"
+        return None
+    finally:
+        db.close()
+
+def find_user_by_phone(db: Session, phone_number: str):
+    try:
+        return db.query(User).filter(User.phone_number == phone_number).first()
+    finally:
+        db.close()
+
+def create_user(db: Session, signup_data: SignupRequest, hashed_password: str):
+    try:
+        user = User(
+            first_name=signup_data.first_name,
+            last_name=signup_data.last_name,
+            national_code=signup_data.national_code,
+            phone_number=signup_data.phone_number,
+            hashed_password=hashed_password
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    finally:
+        db.close()
+
 @router.post("/signup")
-async def signup(request: SignupRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.phone_number == request.phone_number).first():
-        raise HTTPException(status_code=400, detail="Phone number already registered")
-    if db.query(User).filter(User.national_code == request.national_code).first():
-        raise HTTPException(status_code=400, detail="National code already registered")
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{OTP_SERVICE_URL}/otp/generate", json={"phone_number": request.phone_number})
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to generate OTP")
+async def signup(request: SignupRequest, http_request: Request, db: Session = Depends(get_db), client: httpx.AsyncClient = Depends(get_http_client)):
+    await enforce_rate_limit(async_redis_client, "signup", http_request, request.phone_number)
+    conflict = await run_in_threadpool(find_registration_conflict, db, request.phone_number, request.national_code)
+    if conflict:
+        raise HTTPException(status_code=400, detail=conflict)
+    response = await request_with_retry(client, "POST", f"{OTP_SERVICE_URL}/otp/generate", json={"phone_number": request.phone_number})
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to generate OTP")
     return {"message": "OTP sent to phone number", "otp_response": response.json()}
 
 @router.post("/signup/verify")
-async def signup_verify(request: SignupVerifyRequest, signup_data: SignupRequest, db: Session = Depends(get_db)):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{OTP_SERVICE_URL}/otp/validate", json={"phone_number": request.phone_number, "otp": request.otp})
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid OTP")
-    hashed_password = get_password_hash(signup_data.password)
-    user = User(
-        first_name=signup_data.first_name,
-        last_name=signup_data.last_name,
-        national_code=signup_data.national_code,
-        phone_number=signup_data.phone_number,
-        hashed_password=hashed_password
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    access_token = create_access_token(data={"sub": user.id})
+async def signup_verify(request: SignupVerifyRequest, signup_data: SignupRequest, db: Session = Depends(get_db), client: httpx.AsyncClient = Depends(get_http_client)):
+    response = await request_with_retry(client, "POST", f"{OTP_SERVICE_URL}/otp/validate", json={"phone_number": request.phone_number, "otp": request.otp})
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Invalid OTP")
+    hashed_password = await get_password_hash_async(signup_data.password)
+    user = await run_in_threadpool(create_user, db, signup_data, hashed_password)
+    access_token = create_access_token(data={"sub": user.id, "role": user.role})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.phone_number == request.phone_number).first()
+async def login(request: LoginRequest, http_request: Request, db: Session = Depends(get_db), client: httpx.AsyncClient = Depends(get_http_client)):
+    await enforce_rate_limit(async_redis_client, "login", http_request, request.phone_number)
+    user = await run_in_threadpool(find_user_by_phone, db, request.phone_number)
     if not user:
         raise HTTPException(status_code=404, detail="User with this phone number does not exist")
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{OTP_SERVICE_URL}/otp/generate", json={"phone_number": request.phone_number})
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to generate OTP")
+    response = await request_with_retry(client, "POST", f"{OTP_SERVICE_URL}/otp/generate", json={"phone_number": request.phone_number})
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to generate OTP")
     return {"message": "OTP sent to phone number", "otp_response": response.json()}
 
 @router.post("/login/verify")
-async def login_verify(request: LoginVerifyRequest, db: Session = Depends(get_db)):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{OTP_SERVICE_URL}/otp/validate", json={"phone_number": request.phone_number, "otp": request.otp})
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid OTP")
-    user = db.query(User).filter(User.phone_number == request.phone_number).first()
+async def login_verify(request: LoginVerifyRequest, db: Session = Depends(get_db), client: httpx.AsyncClient = Depends(get_http_client)):
+    response = await request_with_retry(client, "POST", f"{OTP_SERVICE_URL}/otp/validate", json={"phone_number": request.phone_number, "otp": request.otp})
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Invalid OTP")
+    user = await run_in_threadpool(find_user_by_phone, db, request.phone_number)
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
-    access_token = create_access_token(data={"sub": user.id})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    access_token = create_access_token(data={"sub": user.id, "role": user.role})
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout")
+def logout(payload: dict = Depends(get_token_payload)):
+    revoke_token(payload)
+    return {"message": "Logged out"}
\ No newline at end of file
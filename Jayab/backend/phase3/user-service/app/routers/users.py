@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from ..models import User
-from ..dependencies import get_db, get_current_user
+from ..dependencies import get_read_db, get_current_user, revoke_user_tokens
+from ..user_cache import user_cache
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -17,11 +18,25 @@ class UserResponse(BaseModel):
 def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
+@router.get("/cache/stats")
+def get_user_cache_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user_cache.stats()
+
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+@router.post("/{user_id}/revoke-tokens")
+def revoke_tokens(user_id: int, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    revoke_user_tokens(user_id)
+    user_cache.invalidate(user_id)
+    return {"message": "User tokens revoked"}
\ No newline at end of file
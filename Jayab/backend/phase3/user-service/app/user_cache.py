@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import User
+from .redis_client import redis_client
+from dotenv import load_dotenv
+import json
+import os
+import redis
+import threading
+import time
+
+load_dotenv()
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_REDIS = os.getenv("USER_CACHE_REDIS", "false").lower() == "true"
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", "300"))
+# The password hash never leaves the database through the cache
+CACHED_FIELDS = ("id", "first_name", "last_name", "national_code", "phone_number", "role")
+
+class UserCache:
+    """TTL-bounded LRU of user rows keyed by id, with an optional shared Redis tier.
+
+    get_current_user runs on the threadpool, so the in-process tier is guarded by a lock.
+    """
+
+    def __init__(self, ttl: float, max_size: int, use_redis: bool, redis_ttl: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, fields)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        """Return a detached User built from cached fields, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return User(**entry[1])
+        if self.use_redis:
+            try:
+                cached = redis_client.get(f"user:{user_id}")
+            except redis.RedisError:
+                cached = None
+            if cached:
+                fields = json.loads(cached)
+                self._store(user_id, fields)
+                with self._lock:
+                    self.redis_hits += 1
+                return User(**fields)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, user: User):
+        fields = {name: getattr(user, name) for name in CACHED_FIELDS}
+        self._store(user.id, fields)
+        if self.use_redis:
+            try:
+                redis_client.setex(f"user:{user.id}", self.redis_ttl, json.dumps(fields))
+            except redis.RedisError:
+                pass
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.use_redis:
+            try:
+                redis_client.delete(f"user:{user_id}")
+            except redis.RedisError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "redis_hits": self.redis_hits, "misses": self.misses}
+
+    def _store(self, user_id: int, fields: dict):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_SIZE, USER_CACHE_REDIS, USER_CACHE_REDIS_TTL)
+
+# Any role or profile change made through the ORM drops the cached copy. Invalidating at
+# flush time would let a read between the flush and the commit re-cache the old row, so
+# changed ids are collected per session and only dropped once the commit has landed.
+@event.listens_for(Session, "after_flush")
+def collect_changed_users(session, flush_context):
+    changed = {user.id for user in (*session.dirty, *session.deleted) if isinstance(user, User)}
+    if changed:
+        session.info.setdefault("changed_users", set()).update(changed)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_users", ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -0,0 +1,78 @@
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Villa, VillaImage
+from .http_client import request_with_retry
+from dotenv import load_dotenv
+import asyncio
+import httpx
+import os
+
+load_dotenv()
+MEDIA_SERVICE_URL = os.getenv("MEDIA_SERVICE_URL")
+MEDIA_UPLOAD_TIMEOUT = float(os.getenv("MEDIA_UPLOAD_TIMEOUT", "30"))
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", "4"))
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "20"))
+
+async def upload_image(client: httpx.AsyncClient, image: UploadFile):
+    # The spooled upload file is streamed to media-service in chunks, not read whole
+    try:
+        files = {"file": (image.filename, image.file, image.content_type)}
+        response = await request_with_retry(client, "POST", f"{MEDIA_SERVICE_URL}/media/upload", files=files, timeout=MEDIA_UPLOAD_TIMEOUT)
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail="Failed to upload image")
+        image_url = response.json().get("url")
+        if not image_url:
+            raise HTTPException(status_code=500, detail="No image URL returned from media-service")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image upload error: {str(e)}")
+    return image_url
+
+async def discard_image(client: httpx.AsyncClient, image_url: str):
+    image_id = image_url.rsplit("/", 1)[-1]
+    try:
+        await request_with_retry(client, "DELETE", f"{MEDIA_SERVICE_URL}/media/{image_id}", timeout=MEDIA_UPLOAD_TIMEOUT)
+    except httpx.HTTPError:
+        pass  # Best effort: the request is failing anyway
+
+async def upload_images(client: httpx.AsyncClient, images: list[UploadFile]):
+    """Upload several images concurrently, at most MEDIA_UPLOAD_CONCURRENCY at a time, keeping their order.
+
+    If any upload fails, the ones that succeeded are deleted again before the error is raised.
+    """
+    if len(images) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+    semaphore = asyncio.Semaphore(MEDIA_UPLOAD_CONCURRENCY)
+
+    async def bounded(image: UploadFile):
+        async with semaphore:
+            return await upload_image(client, image)
+
+    results = await asyncio.gather(*(bounded(image) for image in images), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await asyncio.gather(*(discard_image(client, url) for url in results if isinstance(url, str)))
+        raise errors[0]
+    return results
+
+async def add_images(db: AsyncSession, villa: Villa, urls: list[str], make_cover: bool = False):
+    """Append images to the end of a villa's gallery; the first one becomes cover if asked or if there is none."""
+    if not urls:
+        return []
+    result = await db.execute(
+        select(func.max(VillaImage.position), func.count().filter(VillaImage.is_cover)).where(VillaImage.villa_id == villa.id)
+    )
+    last_position, cover_count = result.one()
+    start = 0 if last_position is None else last_position + 1
+    images = [VillaImage(villa_id=villa.id, url=url, position=start + offset) for offset, url in enumerate(urls)]
+    db.add_all(images)
+    if make_cover or not cover_count:
+        await db.flush()
+        await set_cover(db, villa, images[0])
+    return images
+
+async def set_cover(db: AsyncSession, villa: Villa, image: VillaImage):
+    await db.execute(update(VillaImage).where(VillaImage.villa_id == villa.id, VillaImage.id != image.id).values(is_cover=False))
+    image.is_cover = True
+    # Villa.images mirrors the cover so listings never need to join the gallery
+    villa.images = image.url
@@ -1,10 +1,33 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from .metrics import MetricsMiddleware, monitor_event_loop_lag, metrics_response, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 from . import models
-from .routers import villas
+from .routers import villas, images
+from .http_client import create_http_client
 from dotenv import load_dotenv
+import asyncio
 
 load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    instrument_engine(models.engine)
+    if models.replica_engine is not None:
+        instrument_engine(models.replica_engine, "replica")
+    async with models.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(models.create_indexes)
+        await conn.run_sync(models.backfill_gallery)
+    app.state.http_client = create_http_client()
+    yield
+    lag_monitor.cancel()
+    await app.state.http_client.aclose()
+    await models.engine.dispose()
+    if models.replica_engine is not None:
+        await models.replica_engine.dispose()
+
 app = FastAPI(
     title="Villa Service",
     description="Manages villa creation, updates, and retrieval",
@@ -13,22 +36,33 @@ app = FastAPI(
         {
             "name": "villas",
             "description": "Endpoints for managing villa data and images"
+        },
+        {
+            "name": "villa-images",
+            "description": "Endpoints for adding, removing and ordering villa gallery images"
         }
-    ]
+    ],
+    lifespan=lifespan
 )
 
+# Added first so CORS stays outermost
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-models.Base.metadata.create_all(bind=models.engine)
-
 app.include_router(villas.router, prefix="/villas", tags=["villas"])
+app.include_router(images.router, prefix="/villas", tags=["villa-images"])
 
 @app.get("/", tags=["root"], summary="Root Endpoint of the Villa Service")
 def read_root():
-    return {"message": "Villa Service"}
\ No newline at end of file
+    return {"message": "Villa Service"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
\ No newline at end of file
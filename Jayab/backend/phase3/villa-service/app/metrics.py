@@ -0,0 +1,102 @@
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+import asyncio
+import httpx
+import os
+import time
+
+load_dotenv()
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route and status", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being handled")
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+DOWNSTREAM_LATENCY = Histogram("http_client_request_duration_seconds", "Downstream call latency by target service", ["target", "method", "status"])
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time a session waits for a pooled connection")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["engine"])
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", ["engine"])
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Redis command latency", ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+class MetricsMiddleware:
+    """Time every request, labelled by route template rather than raw path to bound cardinality."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # FastAPI records the matched route in the scope during routing
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+
+async def monitor_event_loop_lag():
+    # A blocked loop shows up as a sleep that overshoots its interval
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(time.perf_counter() - start - EVENT_LOOP_LAG_INTERVAL, 0))
+
+def metrics_response():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+async def start_downstream_timer(request: httpx.Request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+async def observe_downstream(response: httpx.Response):
+    # Fires once headers arrive, so this is time to first byte of the downstream service
+    start = response.request.extensions.get("metrics_start")
+    if start is not None:
+        request = response.request
+        DOWNSTREAM_LATENCY.labels(request.url.host, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+
+HTTP_CLIENT_EVENT_HOOKS = {"request": [start_downstream_timer], "response": [observe_downstream]}
+
+def instrument_engine(engine, name: str = "primary"):
+    # Async engines wrap a sync engine whose pool does the actual checkouts
+    pool = getattr(engine, "sync_engine", engine).pool
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL_CHECKED_OUT.labels(name).set_function(pool.checkedout)
+    DB_POOL_SIZE.labels(name).set_function(pool.size)
+    DB_POOL_OVERFLOW.labels(name).set_function(lambda: max(pool.overflow(), 0))
+
+# A session transaction is created just before its first connection is requested and
+# after_begin fires once that connection is checked out; the gap is the pool wait.
+@event.listens_for(Session, "after_transaction_create")
+def start_checkout_timer(session, transaction):
+    if transaction.parent is None:
+        session.info["checkout_start"] = time.perf_counter()
+
+@event.listens_for(Session, "after_begin")
+def observe_checkout(session, transaction, connection):
+    start = session.info.pop("checkout_start", None)
+    if start is not None:
+        DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+def observe_redis(command, start: float):
+    REDIS_LATENCY.labels(str(command).lower()).observe(time.perf_counter() - start)
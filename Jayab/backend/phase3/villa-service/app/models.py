@@ -1,21 +1,93 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean
+from sqlalchemy import Column, Integer, String, Float, Boolean, Index, ForeignKey, select, exists, event
+from sqlalchemy.orm import relationship, Session
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from collections import OrderedDict
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
-DATABASE_URL = f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# DATABASE_URL overrides the Postgres settings, e.g. to point at SQLite for benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+asyncpg://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}/{os.getenv('POSTGRES_DB')}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+# Optional hot standby for read-only handlers; unset means reads share the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# How long a client keeps reading from the primary after it commits, to cover replica lag
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+def engine_options(url: str):
+    # SQLite runs without a sized connection pool or server-side timeouts
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    }
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+replica_engine = create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)) if DATABASE_REPLICA_URL else None
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(bind=replica_engine or engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+class RecentWrites:
+    """Clients that committed within the read-your-writes window, oldest first.
+
+    Tracked per worker; a client whose next read lands on another worker may see
+    replica lag, which is bounded by the replica's own delay.
+    """
+
+    def __init__(self, window: float, max_size: int = 100000):
+        self.window = window
+        self.max_size = max_size
+        self._until = OrderedDict()  # client key -> monotonic deadline
+
+    def mark(self, key: str):
+        self._until[key] = time.monotonic() + self.window
+        self._until.move_to_end(key)
+        while len(self._until) > self.max_size:
+            self._until.popitem(last=False)
+
+    def active(self, key: str):
+        until = self._until.get(key)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[key]
+            return False
+        return True
+
+recent_writes = RecentWrites(DB_READ_YOUR_WRITES_SECONDS)
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _pin_client_to_primary(session):
+    # Only request sessions carry a client key; background sessions never pin anyone
+    if session.info.pop("wrote", False) and "client" in session.info:
+        recent_writes.mark(session.info["client"])
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
 class Villa(Base):
     __tablename__ = "villas"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    images = Column(String)  # Comma-separated URLs
+    images = Column(String)  # Cover image URL, kept in sync with the gallery's cover row
     city = Column(String, nullable=False)
     address = Column(String, nullable=False)
     base_capacity = Column(Integer, nullable=False)
@@ -26,4 +98,52 @@ class Villa(Base):
     has_cooling_system = Column(Boolean, default=False)
     base_price_per_night = Column(Float, nullable=False)
     extra_person_price = Column(Float, nullable=False)
-    rating = Column(Float, default=0.0)
\ No newline at end of file
+    rating = Column(Float, default=0.0)
+
+    __table_args__ = (
+        # Back the common search filters; id is the keyset tie-breaker
+        Index("ix_villas_city_price", "city", "base_price_per_night", "id"),
+        Index("ix_villas_city_capacity", "city", "maximum_capacity", "id"),
+        Index("ix_villas_city_rating", "city", "rating", "id"),
+        Index("ix_villas_price", "base_price_per_night", "id"),
+        Index("ix_villas_capacity", "maximum_capacity", "id"),
+        Index("ix_villas_rating", "rating", "id"),
+    )
+
+    gallery = relationship("VillaImage", order_by="VillaImage.position", passive_deletes=True)
+
+class VillaImage(Base):
+    __tablename__ = "villa_images"
+    id = Column(Integer, primary_key=True, index=True)
+    villa_id = Column(Integer, ForeignKey("villas.id", ondelete="CASCADE"), nullable=False)
+    url = Column(String, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    is_cover = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_villa_images_villa_position", "villa_id", "position"),
+    )
+
+def create_indexes(connection):
+    # create_all skips existing tables, so add indexes introduced after the table was created
+    for index in Villa.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def backfill_gallery(connection):
+    # Villas created before the gallery table kept their images as one comma-separated string
+    rows = connection.execute(
+        select(Villa.id, Villa.images).where(
+            Villa.images.isnot(None),
+            Villa.images != "",
+            ~exists().where(VillaImage.villa_id == Villa.id),
+        )
+    ).all()
+    for villa_id, images in rows:
+        urls = [url.strip() for url in images.split(",") if url.strip()]
+        if not urls:
+            continue  # e.g. "," or whitespace: nothing to move into the gallery
+        connection.execute(VillaImage.__table__.insert(), [
+            {"villa_id": villa_id, "url": url, "position": position, "is_cover": position == 0}
+            for position, url in enumerate(urls)
+        ])
+        connection.execute(Villa.__table__.update().where(Villa.id == villa_id).values(images=urls[0]))
\ No newline at end of file
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from .redis_client import redis_client
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
+import os
+import redis
+import time
+
+load_dotenv()
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_REDIS = os.getenv("RESPONSE_CACHE_REDIS", "false").lower() == "true"
+RESPONSE_CACHE_REDIS_TTL = int(os.getenv("RESPONSE_CACHE_REDIS_TTL", "300"))
+# Clients may keep a copy but must revalidate it with If-None-Match before use
+CACHE_CONTROL = "no-cache"
+LIST_TAG = "villas"
+
+def villa_tag(villa_id: int):
+    return f"villa:{villa_id}"
+
+def cache_key(endpoint: str, **params):
+    # Keys are built from parsed handler arguments, so "?limit=20" and no limit share an entry
+    normalized = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{endpoint}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+class CachedResponse:
+    def __init__(self, body: str, headers: dict = None, etag: str = None):
+        self.body = body
+        self.headers = headers or {}
+        self.etag = etag or '"%s"' % hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+    def matches(self, if_none_match: str):
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+    def to_response(self, request: Request):
+        headers = {**self.headers, "ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and self.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+    def dump(self, versions):
+        return json.dumps({"v": versions, "b": self.body, "h": self.headers, "e": self.etag})
+
+class ResponseCache:
+    """Rendered catalogue responses with tag invalidation and an optional shared Redis tier.
+
+    Every entry records the version of each tag it depends on when it was filled; admin
+    writes bump the tag versions, so invalidation never has to enumerate keys. Without
+    Redis the bumps stay in the worker that handled the write, and the in-process TTL
+    bounds how stale other workers can be. With the Redis tier on, local hits also compare
+    the shared tag versions in one MGET, so a write on any worker invalidates them all;
+    while Redis is unreachable local hits fall back to the TTL. Concurrent misses for one
+    key wait on the first request's fill instead of each running the query.
+    """
+
+    def __init__(self, ttl: float, max_size: int, use_redis: bool, redis_ttl: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, local versions, shared versions, CachedResponse)
+        self._tag_versions = {}  # tag -> local version
+        self._inflight = {}  # key -> future resolved by the request filling it
+        self.hits = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def fetch(self, key: str, tags, fill):
+        """Return the cached response for key, calling fill() to render it on a miss."""
+        local_versions = self._local_versions(tags)
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic() and entry[1] == local_versions:
+            shared_versions = await self._shared_versions(tags) if self.use_redis else None
+            if shared_versions is None or shared_versions == entry[2]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            cached = await asyncio.shield(pending)
+            # The first request failed (e.g. a 404); render this one on its own
+            return cached if cached is not None else await fill()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        cached = None
+        try:
+            cached = await self._fill(key, tags, local_versions, fill)
+            return cached
+        finally:
+            del self._inflight[key]
+            future.set_result(cached)
+
+    async def invalidate(self, *tags):
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+        if self.use_redis:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for tag in tags:
+                        pipe.incr(f"villa-response-tag:{tag}")
+                    await pipe.execute()
+            except redis.RedisError:
+                pass  # shared entries lapse once RESPONSE_CACHE_REDIS_TTL passes
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+        }
+
+    async def _fill(self, key: str, tags, local_versions, fill):
+        shared_versions = None
+        if self.use_redis:
+            # One round trip fetches the shared entry together with the current tag versions
+            try:
+                stored, *versions = await redis_client.mget(f"villa-response:{key}", *(f"villa-response-tag:{tag}" for tag in tags))
+                shared_versions = [int(version or 0) for version in versions]
+            except redis.RedisError:
+                stored = None
+            if stored:
+                payload = json.loads(stored)
+                if payload["v"] == shared_versions:
+                    self.redis_hits += 1
+                    cached = CachedResponse(payload["b"], payload["h"], payload["e"])
+                    self._store(key, local_versions, shared_versions, cached)
+                    return cached
+
+        self.misses += 1
+        cached = await fill()
+        self._store(key, local_versions, shared_versions, cached)
+        if shared_versions is not None:
+            try:
+                await redis_client.set(f"villa-response:{key}", cached.dump(shared_versions), ex=self.redis_ttl)
+            except redis.RedisError:
+                pass
+        return cached
+
+    def _local_versions(self, tags):
+        return [self._tag_versions.get(tag, 0) for tag in tags]
+
+    async def _shared_versions(self, tags):
+        try:
+            versions = await redis_client.mget(*(f"villa-response-tag:{tag}" for tag in tags))
+        except redis.RedisError:
+            return None
+        return [int(version or 0) for version in versions]
+
+    def _store(self, key: str, local_versions, shared_versions, cached: CachedResponse):
+        # Versions were read before the fill, so a write that lands mid-fill leaves the entry stale on arrival
+        self._entries[key] = (time.monotonic() + self.ttl, local_versions, shared_versions, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_REDIS, RESPONSE_CACHE_REDIS_TTL)
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from pydantic import BaseModel
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+import httpx
+
+from ..models import Villa, VillaImage
+from ..dependencies import get_db, get_read_db, get_current_admin
+from ..http_client import get_http_client
+from ..gallery import upload_images, add_images, set_cover
+from ..response_cache import response_cache, villa_tag, LIST_TAG
+from .villas import VillaImageResponse, invalidate_reservation_cache
+
+router = APIRouter()
+
+class ImageOrder(BaseModel):
+    image_ids: List[int]
+
+async def get_villa_or_404(db: AsyncSession, villa_id: int):
+    villa = await db.get(Villa, villa_id)
+    if not villa:
+        raise HTTPException(status_code=404, detail="Villa not found")
+    return villa
+
+async def list_gallery(db: AsyncSession, villa_id: int):
+    # Bulk updates bypass the identity map, so reload rows over any stale instances
+    result = await db.execute(
+        select(VillaImage).where(VillaImage.villa_id == villa_id).order_by(VillaImage.position)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+@router.get("/{villa_id}/images", response_model=List[VillaImageResponse])
+async def get_villa_images(villa_id: int, db: AsyncSession = Depends(get_read_db)):
+    await get_villa_or_404(db, villa_id)
+    return await list_gallery(db, villa_id)
+
+@router.post("/{villa_id}/images", response_model=List[VillaImageResponse])
+async def add_villa_images(
+    request: Request,
+    villa_id: int,
+    images: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    villa = await get_villa_or_404(db, villa_id)
+    image_urls = await upload_images(client, images)
+    had_cover = villa.images
+    await add_images(db, villa, image_urls)
+    await db.commit()
+    # The gallery only shows in the detail response; list entries carry just the cover
+    await response_cache.invalidate(villa_tag(villa_id))
+    if villa.images != had_cover:
+        await response_cache.invalidate(LIST_TAG)
+        await invalidate_reservation_cache(client, villa_id, request)
+    return await list_gallery(db, villa_id)
+
+@router.delete("/{villa_id}/images/{image_id}", response_model=List[VillaImageResponse])
+async def remove_villa_image(
+    request: Request,
+    villa_id: int,
+    image_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    villa = await get_villa_or_404(db, villa_id)
+    image = await db.get(VillaImage, image_id)
+    if not image or image.villa_id != villa_id:
+        raise HTTPException(status_code=404, detail="Image not found")
+    await db.delete(image)
+    await db.flush()
+
+    if image.is_cover:
+        # Promote the next image in order, or clear the cover if the gallery is now empty
+        remaining = await list_gallery(db, villa_id)
+        if remaining:
+            await set_cover(db, villa, remaining[0])
+        else:
+            villa.images = None
+    await db.commit()
+    await response_cache.invalidate(villa_tag(villa_id))
+    if image.is_cover:
+        await response_cache.invalidate(LIST_TAG)
+        await invalidate_reservation_cache(client, villa_id, request)
+    return await list_gallery(db, villa_id)
+
+@router.put("/{villa_id}/images/order", response_model=List[VillaImageResponse])
+async def reorder_villa_images(
+    villa_id: int,
+    order: ImageOrder,
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin),
+):
+    await get_villa_or_404(db, villa_id)
+    current = {image.id for image in await list_gallery(db, villa_id)}
+    if set(order.image_ids) != current or len(order.image_ids) != len(current):
+        raise HTTPException(status_code=400, detail="image_ids must list every image of the villa exactly once")
+    if order.image_ids:
+        positions = {image_id: position for position, image_id in enumerate(order.image_ids)}
+        await db.execute(
+            update(VillaImage)
+            .where(VillaImage.villa_id == villa_id)
+            .values(position=case(positions, value=VillaImage.id))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await response_cache.invalidate(villa_tag(villa_id))
+    return await list_gallery(db, villa_id)
+
+@router.put("/{villa_id}/images/{image_id}/cover", response_model=List[VillaImageResponse])
+async def set_villa_cover(
+    request: Request,
+    villa_id: int,
+    image_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    villa = await get_villa_or_404(db, villa_id)
+    image = await db.get(VillaImage, image_id)
+    if not image or image.villa_id != villa_id:
+        raise HTTPException(status_code=404, detail="Image not found")
+    await set_cover(db, villa, image)
+    await db.commit()
+    await response_cache.invalidate(LIST_TAG, villa_tag(villa_id))
+    await invalidate_reservation_cache(client, villa_id, request)
+    return await list_gallery(db, villa_id)
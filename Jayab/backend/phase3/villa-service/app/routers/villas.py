@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional, Literal
+from datetime import date
+import base64
 import httpx
 import json
 from dotenv import load_dotenv
 import os
 
 from ..models import Villa
-from ..dependencies import get_db, get_current_admin
+from ..dependencies import get_db, get_read_db, get_current_user, get_current_admin
+from ..http_client import get_http_client, request_with_retry
+from ..gallery import upload_images, add_images
+from ..response_cache import response_cache, cache_key, villa_tag, CachedResponse, LIST_TAG
 
 load_dotenv()
-MEDIA_SERVICE_URL = os.getenv("MEDIA_SERVICE_URL")
+RESERVATION_SERVICE_URL = os.getenv("RESERVATION_SERVICE_URL")
+DEFAULT_PAGE_SIZE = int(os.getenv("VILLA_DEFAULT_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("VILLA_MAX_PAGE_SIZE", "100"))
+AVAILABLE_MAX_SCAN_PAGES = int(os.getenv("VILLA_AVAILABLE_MAX_SCAN_PAGES", "5"))
+SORT_COLUMNS = {
+    "id": Villa.id,
+    "price": Villa.base_price_per_night,
+    "rating": Villa.rating,
+    "capacity": Villa.maximum_capacity,
+}
+SortOption = Literal["id", "price", "-price", "rating", "-rating", "capacity", "-capacity"]
 router = APIRouter()
 
 class VillaCreate(BaseModel):
@@ -31,7 +48,8 @@ class VillaCreate(BaseModel):
 class VillaResponse(BaseModel):
     id: int
     title: str
-    images: str
+    # Cover image URL; None once a villa's last gallery image is removed
+    images: Optional[str] = None
     city: str
     address: str
     base_capacity: int
@@ -44,12 +62,40 @@ class VillaResponse(BaseModel):
     extra_person_price: float
     rating: float
 
-@router.post("/", response_model=VillaResponse)
+class VillaImageResponse(BaseModel):
+    id: int
+    url: str
+    position: int
+    is_cover: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
+class VillaDetailResponse(VillaResponse):
+    gallery: List[VillaImageResponse] = []
+
+villa_list_adapter = TypeAdapter(List[VillaResponse])
+villa_detail_adapter = TypeAdapter(VillaDetailResponse)
+
+def render(adapter: TypeAdapter, value, headers: dict = None):
+    # Serialise once into the cached body; hits skip response_model validation entirely
+    return CachedResponse(adapter.dump_json(adapter.validate_python(value, from_attributes=True)).decode(), headers)
+
+async def invalidate_reservation_cache(client: httpx.AsyncClient, villa_id: int, request: Request):
+    # The endpoint is admin-only, so the admin's own bearer token is forwarded
+    headers = {"Authorization": request.headers.get("authorization", "")}
+    try:
+        await request_with_retry(client, "POST", f"{RESERVATION_SERVICE_URL}/reservations/villa-cache/{villa_id}/invalidate", headers=headers, timeout=2)
+    except httpx.HTTPError:
+        pass  # reservation-service drops the entry on its own once VILLA_CACHE_TTL passes
+
+@router.post("/", response_model=VillaDetailResponse)
 async def create_villa(
     villa: str = Form(...),
-    image: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    image: Optional[UploadFile] = File(None),
+    images: List[UploadFile] = File([]),
+    db: AsyncSession = Depends(get_db),
     admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     try:
         villa_data = json.loads(villa)
@@ -59,35 +105,34 @@ async def create_villa(
     except ValueError as e:
         raise HTTPException(status_code=422, detail=f"Villa validation error: {str(e)}")
 
-    # Upload image to media-service
-    try:
-        async with httpx.AsyncClient() as client:
-            files = {"file": (image.filename, await image.read(), image.content_type)}
-            response = await client.post(f"{MEDIA_SERVICE_URL}/media/upload", files=files)
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to upload image")
-            image_url = response.json().get("url")
-            if not image_url:
-                raise HTTPException(status_code=500, detail="No image URL returned from media-service")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image upload error: {str(e)}")
-
-    # Create villa in database
-    db_villa = Villa(**villa_obj.model_dump(), images=image_url)
+    # Upload images to media-service; "image" is the single-file form older clients send
+    uploads = ([image] if image else []) + images
+    if not uploads:
+        raise HTTPException(status_code=422, detail="At least one image is required")
+    image_urls = await upload_images(client, uploads)
+
+    # Create villa and its gallery in database
+    db_villa = Villa(**villa_obj.model_dump())
     db.add(db_villa)
-    db.commit()
-    db.refresh(db_villa)
+    await db.flush()
+    await add_images(db, db_villa, image_urls)
+    await db.commit()
+    await db.refresh(db_villa, attribute_names=["gallery"])
+    await response_cache.invalidate(LIST_TAG)
     return db_villa
 
-@router.put("/{villa_id}", response_model=VillaResponse)
+@router.put("/{villa_id}", response_model=VillaDetailResponse)
 async def update_villa(
+    request: Request,
     villa_id: int,
     villa: str = Form(...),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    images: List[UploadFile] = File([]),
+    db: AsyncSession = Depends(get_db),
     admin: dict = Depends(get_current_admin),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
-    db_villa = db.query(Villa).filter(Villa.id == villa_id).first()
+    db_villa = await db.get(Villa, villa_id)
     if not db_villa:
         raise HTTPException(status_code=404, detail="Villa not found")
 
@@ -100,52 +145,202 @@ async def update_villa(
     except ValueError as e:
         raise HTTPException(status_code=422, detail=f"Villa validation error: {str(e)}")
 
-    # Handle image upload if provided
-    image_url = db_villa.images
-    if image:
-        try:
-            async with httpx.AsyncClient() as client:
-                files = {"file": (image.filename, await image.read(), image.content_type)}
-                response = await client.post(f"{MEDIA_SERVICE_URL}/media/upload", files=files)
-                if response.status_code != 200:
-                    raise HTTPException(status_code=500, detail="Failed to upload image")
-                image_url = response.json().get("url")
-                if not image_url:
-                    raise HTTPException(status_code=500, detail="No image URL returned from media-service")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Image upload error: {str(e)}")
+    # Uploaded images are appended to the gallery; a single "image" replaces the cover as before
+    uploads = ([image] if image else []) + images
+    image_urls = await upload_images(client, uploads)
 
     # Update villa attributes
     for key, value in villa_obj.model_dump().items():
         setattr(db_villa, key, value)
-    db_villa.images = image_url
-    db.commit()
-    db.refresh(db_villa)
+    await add_images(db, db_villa, image_urls, make_cover=image is not None)
+    await db.commit()
+    await db.refresh(db_villa, attribute_names=["gallery"])
+    await response_cache.invalidate(LIST_TAG, villa_tag(villa_id))
+    await invalidate_reservation_cache(client, villa_id, request)
     return db_villa
 
 @router.delete("/{villa_id}")
-async def delete_villa(villa_id: int, db: Session = Depends(get_db), admin: dict = Depends(get_current_admin)):
-    db_villa = db.query(Villa).filter(Villa.id == villa_id).first()
+async def delete_villa(request: Request, villa_id: int, db: AsyncSession = Depends(get_db), admin: dict = Depends(get_current_admin), client: httpx.AsyncClient = Depends(get_http_client)):
+    db_villa = await db.get(Villa, villa_id)
     if not db_villa:
         raise HTTPException(status_code=404, detail="Villa not found")
-    db.delete(db_villa)
-    db.commit()
+    await db.delete(db_villa)
+    await db.commit()
+    await response_cache.invalidate(LIST_TAG, villa_tag(villa_id))
+    await invalidate_reservation_cache(client, villa_id, request)
     return {"message": "Villa deleted"}
 
+def encode_cursor(sort: str, villa: Villa):
+    key = sort.lstrip("-")
+    value = getattr(villa, SORT_COLUMNS[key].key)
+    payload = json.dumps({"s": sort, "v": value, "id": villa.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(sort: str, cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload["s"] != sort:
+            raise ValueError
+        return payload["v"], int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(db: AsyncSession, query, sort: str, limit: int, cursor: Optional[str]):
+    """Keyset pagination on (sort column, id) so deep pages cost the same as the first one.
+
+    Returns the page and the cursor for the next one, or None on the last page.
+    """
+    column = SORT_COLUMNS[sort.lstrip("-")]
+    descending = sort.startswith("-")
+    if cursor:
+        value, last_id = decode_cursor(sort, cursor)
+        keys, bound = tuple_(column, Villa.id), tuple_(value, last_id)
+        query = query.filter(keys < bound if descending else keys > bound)
+    if descending:
+        query = query.order_by(column.desc(), Villa.id.desc())
+    else:
+        query = query.order_by(column.asc(), Villa.id.asc())
+
+    result = await db.execute(query.limit(limit + 1))
+    villas = result.scalars().all()
+    if len(villas) > limit:
+        villas = villas[:limit]
+        return villas, encode_cursor(sort, villas[-1])
+    return villas, None
+
+def parse_ids(ids: str):
+    try:
+        villa_ids = {int(part) for part in ids.split(",") if part.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(villa_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    return villa_ids
+
 @router.get("/", response_model=List[VillaResponse])
-async def list_villas(city: str = None, min_capacity: int = None, max_price: float = None, db: Session = Depends(get_db)):
-    query = db.query(Villa)
+async def list_villas(
+    request: Request,
+    ids: str = None,
+    city: str = None,
+    min_capacity: int = None,
+    min_price: float = None,
+    max_price: float = None,
+    min_beds: int = None,
+    has_pool: bool = None,
+    has_cooling_system: bool = None,
+    sort: SortOption = "id",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    # Misses read the primary: the cache already absorbs repeat reads, and a refill right
+    # after an admin write must not capture a lagging replica
+    db: AsyncSession = Depends(get_db),
+):
+    if ids is not None:
+        # Batch lookup by primary key; the other filters and paging do not apply
+        villa_ids = sorted(parse_ids(ids))
+        async def fill_batch():
+            result = await db.execute(select(Villa).filter(Villa.id.in_(villa_ids)).order_by(Villa.id))
+            return render(villa_list_adapter, result.scalars().all())
+        cached = await response_cache.fetch(cache_key("list-ids", ids=villa_ids), [LIST_TAG], fill_batch)
+        return cached.to_response(request)
+
+    query = select(Villa)
     if city:
         query = query.filter(Villa.city == city)
-    if min_capacity:
+    if min_capacity is not None:
         query = query.filter(Villa.maximum_capacity >= min_capacity)
-    if max_price:
+    if min_price is not None:
+        query = query.filter(Villa.base_price_per_night >= min_price)
+    if max_price is not None:
         query = query.filter(Villa.base_price_per_night <= max_price)
-    return query.all()
+    if min_beds is not None:
+        query = query.filter(Villa.bed_count >= min_beds)
+    if has_pool is not None:
+        query = query.filter(Villa.has_pool == has_pool)
+    if has_cooling_system is not None:
+        query = query.filter(Villa.has_cooling_system == has_cooling_system)
 
-@router.get("/{villa_id}", response_model=VillaResponse)
-async def get_villa(villa_id: int, db: Session = Depends(get_db)):
-    villa = db.query(Villa).filter(Villa.id == villa_id).first()
-    if not villa:
-        raise HTTPException(status_code=404, detail="Villa not found")
-    return villa
\ No newline at end of file
+    async def fill_page():
+        villas, next_cursor = await paginate(db, query, sort, limit, cursor)
+        return render(villa_list_adapter, villas, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+    key = cache_key(
+        "list", city=city, min_capacity=min_capacity, min_price=min_price, max_price=max_price, min_beds=min_beds,
+        has_pool=has_pool, has_cooling_system=has_cooling_system, sort=sort, limit=limit, cursor=cursor,
+    )
+    cached = await response_cache.fetch(key, [LIST_TAG], fill_page)
+    return cached.to_response(request)
+
+async def fetch_booked_ids(client: httpx.AsyncClient, request: Request, villa_ids, check_in_date: date, check_out_date: date):
+    # booked-villas is a user route, so the caller's own bearer token is forwarded
+    try:
+        booked = await request_with_retry(client, "GET", f"{RESERVATION_SERVICE_URL}/reservations/booked-villas", params={
+            "check_in_date": check_in_date.isoformat(),
+            "check_out_date": check_out_date.isoformat(),
+            "villa_ids": ",".join(map(str, villa_ids)),
+        }, headers={"Authorization": request.headers.get("authorization", "")})
+    except httpx.HTTPError:
+        raise HTTPException(status_code=500, detail="Failed to fetch reservations")
+    if booked.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to fetch reservations")
+    return set(booked.json())
+
+@router.get("/available", response_model=List[VillaResponse])
+async def list_available_villas(
+    request: Request,
+    response: Response,
+    city: str,
+    check_in_date: date,
+    check_out_date: date,
+    people_count: int = Query(1, ge=1),
+    sort: SortOption = "id",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: AsyncSession = Depends(get_read_db),
+    client: httpx.AsyncClient = Depends(get_http_client),
+    user: dict = Depends(get_current_user),
+):
+    """Walk candidate pages in keyset order and keep the villas free for the whole stay.
+
+    Each page is checked against reservation-service by id, so no request carries more than
+    limit ids. A page that comes back short because the scan budget ran out still returns a
+    cursor, and the client continues from where the scan stopped.
+    """
+    if check_in_date >= check_out_date:
+        raise HTTPException(status_code=400, detail="Invalid dates: check-in must be before check-out")
+
+    query = select(Villa).filter(Villa.city == city, Villa.maximum_capacity >= people_count)
+    available, next_cursor = [], cursor
+    for _ in range(AVAILABLE_MAX_SCAN_PAGES):
+        candidates, next_cursor = await paginate(db, query, sort, limit, next_cursor)
+        if not candidates:
+            break
+        booked_ids = await fetch_booked_ids(client, request, [villa.id for villa in candidates], check_in_date, check_out_date)
+        for position, villa in enumerate(candidates):
+            if villa.id in booked_ids:
+                continue
+            available.append(villa)
+            if len(available) == limit:
+                # Resume right after the last villa returned if this page or later ones have more
+                if position < len(candidates) - 1 or next_cursor:
+                    next_cursor = encode_cursor(sort, villa)
+                break
+        if len(available) == limit or not next_cursor:
+            break
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return available
+
+@router.get("/cache/stats")
+async def get_response_cache_stats(admin: dict = Depends(get_current_admin)):
+    return response_cache.stats()
+
+@router.get("/{villa_id}", response_model=VillaDetailResponse)
+async def get_villa(request: Request, villa_id: int, db: AsyncSession = Depends(get_db)):
+    # Misses read the primary for the same reason as list_villas
+    async def fill():
+        villa = await db.get(Villa, villa_id, options=[selectinload(Villa.gallery)])
+        if not villa:
+            raise HTTPException(status_code=404, detail="Villa not found")
+        return render(villa_detail_adapter, villa)
+    cached = await response_cache.fetch(cache_key("detail", villa_id=villa_id), [villa_tag(villa_id)], fill)
+    return cached.to_response(request)
\ No newline at end of file
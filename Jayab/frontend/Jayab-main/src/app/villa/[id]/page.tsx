@@ -79,14 +79,16 @@ export default function VillaDetailPage() {
       <div className="px-6 py-6">
         <div className="max-w-6xl mx-auto">
           <div className="relative w-full aspect-[2/1] rounded-2xl overflow-hidden shadow-lg">
-            <Image
-              src={villa.images}
-              alt={villa.title}
-              fill
-              className="object-cover"
-              sizes="(max-width: 768px) 100vw, (max-width: 1200px) 90vw, 1200px"
-              priority
-            />
+            {villa.images && (
+              <Image
+                src={villa.images}
+                alt={villa.title}
+                fill
+                className="object-cover"
+                sizes="(max-width: 768px) 100vw, (max-width: 1200px) 90vw, 1200px"
+                priority
+              />
+            )}
           </div>
         </div>
       </div>
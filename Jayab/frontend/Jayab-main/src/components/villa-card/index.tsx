@@ -5,7 +5,7 @@ import { cn } from "@/lib/utils";
 interface Villa {
   id: number;
   title: string;
-  images: string;
+  images: string | null;
   city: string;
   address: string;
   base_capacity: number;
@@ -41,13 +41,15 @@ export function VillaCard({ villa, className }: VillaCardProps) {
     >
       {/* Image Section */}
       <div className="relative h-48 w-full">
-        <Image
-          src={villa.images}
-          alt={villa.title}
-          fill
-          className="object-cover"
-          sizes="(max-width: 768px) 100vw, (max-width: 1200px) 50vw, 33vw"
-        />
+        {villa.images && (
+          <Image
+            src={villa.images}
+            alt={villa.title}
+            fill
+            className="object-cover"
+            sizes="(max-width: 768px) 100vw, (max-width: 1200px) 50vw, 33vw"
+          />
+        )}
       </div>
 
       {/* Content Section */}